@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import hashlib
+import tarfile
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Callable, List, Tuple, Set
+
+# Called on the worker thread with (source file, archive file or None if unchanged, error message or None)
+BackupCallback = Callable[[str, Optional[str], Optional[str]], None]
+
+
+class BackupManager:
+    """
+    Back up files as tar.gz archives named <time>_<suffix>.tar.gz, on a worker thread. A file is skipped if it is
+    unchanged (by size and mtime, then by SHA-256) since the last archive of the same suffix. After each backup, archives
+    of the suffix are pruned: the last keep_last archives are kept, plus the latest archive of each of the last
+    keep_daily days and keep_weekly weeks.
+    """
+
+    TIME_FORMAT = "%Y_%m_%d_%H_%M_%S"
+    ARCHIVE_PATTERN = re.compile(r"^(\d{4}_\d{2}_\d{2}_\d{2}_\d{2}_\d{2})(?:_(.*))?\.tar\.gz$")
+    INDEX_FILE = "index.json"
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, keep_last: int = 10, keep_daily: int = 7, keep_weekly: int = 4):
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+        # A single worker, so that backups to the same directory never race on the index or pruning
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+
+    def backup(self, file: str, backup_dir: str, suffix: str = "", done: Optional[BackupCallback] = None) -> Future:
+        """
+        Queue a backup of the file into backup_dir and return immediately.
+        :return: Future resolving to the archive file, or None if the file is unchanged
+        """
+        future = self._pool.submit(self._backup, file, backup_dir, suffix)
+        if done is not None:
+            future.add_done_callback(lambda f: self._report(file, f, done))
+        return future
+
+    @staticmethod
+    def _report(file: str, future: Future, done: BackupCallback) -> None:
+        err = future.exception()
+        if err is not None:
+            done(file, None, str(err))
+        else:
+            done(file, future.result(), None)
+
+    def _backup(self, file: str, backup_dir: str, suffix: str) -> Optional[str]:
+        os.makedirs(backup_dir, exist_ok=True)
+        index = self._load_index(backup_dir)
+
+        stat = os.stat(file)
+        last = index.get(suffix)
+        if last is not None and not os.path.exists(os.path.join(backup_dir, last["archive"])):
+            last = None
+        if last is not None and last["size"] == stat.st_size and last["mtime_ns"] == stat.st_mtime_ns:
+            return None
+
+        sha256 = self.hash_file(file)
+        if last is not None and last["sha256"] == sha256:
+            last["mtime_ns"] = stat.st_mtime_ns  # skip hashing next time
+            self._save_index(backup_dir, index)
+            return None
+
+        name = datetime.now().strftime(self.TIME_FORMAT)
+        if suffix != "":
+            name += "_" + suffix
+        archive = os.path.join(backup_dir, name + ".tar.gz")
+        temp_file = archive + ".tmp"
+        with tarfile.open(temp_file, "w:gz") as tar:
+            tar.add(file, arcname=name)
+        os.replace(temp_file, archive)
+
+        index[suffix] = {"archive": os.path.basename(archive), "sha256": sha256, "size": stat.st_size,
+                         "mtime_ns": stat.st_mtime_ns}
+        self._save_index(backup_dir, index)
+        self.prune(backup_dir, suffix)
+        return archive
+
+    @classmethod
+    def hash_file(cls, file: str) -> str:
+        h = hashlib.sha256()
+        with open(file, "rb") as f:
+            while True:
+                chunk = f.read(cls.HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                h.update(chunk)
+        return h.hexdigest()
+
+    def prune(self, backup_dir: str, suffix: str) -> None:
+        """Remove archives of the suffix out of the retention policy."""
+        archives = []
+        for name in os.listdir(backup_dir):
+            m = self.ARCHIVE_PATTERN.match(name)
+            if m is not None and (m.group(2) or "") == suffix:
+                archives.append((datetime.strptime(m.group(1), self.TIME_FORMAT), name))
+        retained = self.select_retained(archives, datetime.now())
+        for _, name in archives:
+            if name not in retained:
+                os.remove(os.path.join(backup_dir, name))
+
+    def select_retained(self, archives: List[Tuple[datetime, str]], now: datetime) -> Set[str]:
+        """Return names of archives to keep, given (time, name) of archives."""
+        archives = sorted(archives, reverse=True)  # latest first
+        retained = set(name for _, name in archives[:self.keep_last])
+        days = set()
+        weeks = set()
+        for t, name in archives:
+            day = t.date()
+            if now.date() - day < timedelta(days=self.keep_daily) and day not in days:
+                days.add(day)
+                retained.add(name)
+            week = day - timedelta(days=day.weekday())  # Monday of the week
+            if now.date() - week < timedelta(weeks=self.keep_weekly) and week not in weeks:
+                weeks.add(week)
+                retained.add(name)
+        return retained
+
+    def _load_index(self, backup_dir: str) -> dict:
+        try:
+            with open(os.path.join(backup_dir, self.INDEX_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}  # start over with a missing or broken index
+
+    def _save_index(self, backup_dir: str, index: dict) -> None:
+        index_file = os.path.join(backup_dir, self.INDEX_FILE)
+        with open(index_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(index_file + ".tmp", index_file)
+
+    def wait(self) -> None:
+        """Wait for queued backups."""
+        self._pool.submit(lambda: None).result()
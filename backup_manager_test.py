@@ -0,0 +1,61 @@
+import os
+import tarfile
+import tempfile
+from datetime import datetime, timedelta
+from unittest import TestCase
+from backup_manager import *
+
+
+class BackupManagerTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.backup_dir = os.path.join(self.dir.name, "backup")
+        self.file = os.path.join(self.dir.name, "vocab.db")
+        with open(self.file, "w") as f:
+            f.write("words")
+        self.manager = BackupManager()
+
+    def tearDown(self):
+        self.manager.wait()
+        self.dir.cleanup()
+
+    def test_skip_unchanged(self):
+        archive = self.manager.backup(self.file, self.backup_dir, "kindle").result()
+        with tarfile.open(archive, "r:gz") as tar:
+            self.assertEqual(b"words", tar.extractfile(tar.getmembers()[0]).read())
+        self.assertIsNone(self.manager.backup(self.file, self.backup_dir, "kindle").result())
+
+        os.utime(self.file, ns=(0, 0))  # touched but unchanged
+        self.assertIsNone(self.manager.backup(self.file, self.backup_dir, "kindle").result())
+
+        os.remove(archive)  # archive removed by the user
+        self.assertIsNotNone(self.manager.backup(self.file, self.backup_dir, "kindle").result())
+
+    def test_callback(self):
+        results = []
+        self.manager.backup(self.file, self.backup_dir, "kindle", done=lambda *args: results.append(args))
+        self.manager.backup(os.path.join(self.dir.name, "missing.db"), self.backup_dir, "kindle",
+                            done=lambda *args: results.append(args))
+        self.manager.wait()
+        self.assertEqual(2, len(results))
+        self.assertTrue(results[0][1].endswith("_kindle.tar.gz"))
+        self.assertIsNone(results[0][2])
+        self.assertIsNone(results[1][1])
+        self.assertIn("missing.db", results[1][2])
+
+    def test_retention(self):
+        manager = BackupManager(keep_last=2, keep_daily=3, keep_weekly=2)
+        now = datetime(2026, 10, 15, 12)  # Thursday
+        archives = [(now - timedelta(hours=h), "%d" % h) for h in [0, 1, 2, 24, 25, 48, 72, 24 * 7, 24 * 20]]
+        # last 2: 0, 1; daily: 0, 24, 48; weekly: 0 (this week), 24 * 7 (last week)
+        self.assertEqual({"0", "1", "24", "48", "168"}, manager.select_retained(archives, now))
+
+    def test_prune(self):
+        manager = BackupManager(keep_last=1, keep_daily=0, keep_weekly=0)
+        os.makedirs(self.backup_dir)
+        for name in ["2020_01_01_00_00_00_kindle.tar.gz", "2020_01_02_00_00_00_kindle.tar.gz",
+                     "2020_01_01_00_00_00_words.csv.tar.gz", "notes.txt"]:
+            open(os.path.join(self.backup_dir, name), "w").close()
+        manager.prune(self.backup_dir, "kindle")
+        self.assertEqual(["2020_01_01_00_00_00_words.csv.tar.gz", "2020_01_02_00_00_00_kindle.tar.gz", "notes.txt"],
+                         sorted(os.listdir(self.backup_dir)))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+from time import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class CollinsEntry:
+    suggestion: Optional[str]  # word of the final (possibly redirected) URL, None if not a dictionary page
+    freq: int
+    freq_note: str
+    timestamp: float
+
+
+class CollinsCache:
+    """
+    Persistent cache of what a Collins page tells about a word: the suggestion from the final URL and the frequency
+    band. Keyed on the dictionary directory and the preprocessed subject, i.e. what makes the URL. Entries older than
+    ttl seconds are treated as missing and purged on open, as Collins updates its pages from time to time.
+    Safe to use from multiple threads.
+    """
+
+    DEFAULT_TTL = 30 * 24 * 3600  # [s]
+
+    def __init__(self, db_file: str, ttl: float = DEFAULT_TTL):
+        self.db_file = db_file
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        if os.path.dirname(db_file) != "":
+            os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS collins (
+              dictionary TEXT NOT NULL,
+              subject TEXT NOT NULL,
+              suggestion TEXT,
+              freq INTEGER NOT NULL,
+              freq_note TEXT NOT NULL,
+              timestamp REAL NOT NULL,
+              PRIMARY KEY (dictionary, subject)
+            )
+            """)
+        self._conn.commit()
+        self.purge()
+
+    def get(self, dictionary: str, subject: str) -> Optional[CollinsEntry]:
+        """Return the entry of the word, or None if missing or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT suggestion, freq, freq_note, timestamp FROM collins WHERE dictionary = ? AND subject = ?",
+                (dictionary, subject)).fetchone()
+            if row is None or row[3] < time() - self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return CollinsEntry(*row)
+
+    def put(self, dictionary: str, subject: str, suggestion: Optional[str], freq: int, freq_note: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO collins VALUES (?, ?, ?, ?, ?, ?)",
+                               (dictionary, subject, suggestion, freq, freq_note, time()))
+            self._conn.commit()
+
+    def purge(self) -> None:
+        """Remove expired entries."""
+        with self._lock:
+            self._conn.execute("DELETE FROM collins WHERE timestamp < ?", (time() - self.ttl,))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM collins").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,38 @@
+import os
+import tempfile
+from unittest import TestCase
+from collins_cache import *
+
+
+class CollinsCacheTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.dir.name, "collins_cache.db")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_put_get_and_persistence(self):
+        cache = CollinsCache(self.db_file)
+        self.assertIsNone(cache.get("english", "ran"))
+        cache.put("english", "ran", "run", 5, "Used extremely often")
+        cache.put("english", "qwerty", None, 0, "Fail to find the word")
+        cache.close()
+
+        cache = CollinsCache(self.db_file)
+        entry = cache.get("english", "ran")
+        self.assertEqual(("run", 5, "Used extremely often"), (entry.suggestion, entry.freq, entry.freq_note))
+        self.assertIsNone(cache.get("english", "qwerty").suggestion)
+        self.assertIsNone(cache.get("german-english", "ran"))  # keyed on the dictionary too
+        self.assertEqual({"hits": 2, "misses": 1, "entries": 2}, cache.stats())
+        cache.close()
+
+    def test_ttl(self):
+        cache = CollinsCache(self.db_file, ttl=-1)  # everything has expired
+        cache.put("english", "ran", "run", 5, "")
+        self.assertIsNone(cache.get("english", "ran"))
+        cache.close()
+
+        cache = CollinsCache(self.db_file, ttl=-1)
+        self.assertEqual(0, cache.stats()["entries"])  # purged on open
+        cache.close()
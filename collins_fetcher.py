@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import http.client
+from dataclasses import dataclass
+from urllib.parse import urljoin, urlsplit
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Callable, Dict, Tuple, List
+
+from pyquery import PyQuery
+
+
+def parse_collins_freq(html: str) -> (int, str):
+    """
+    Parse Collins webpage html and return frequency and note.
+    :param html:
+    :return: (freq, note)
+    """
+    try:
+        doc = PyQuery(html)
+        freq_obj = doc(".word-frequency-img")
+        if freq_obj is None:
+            return 0, "Fail to find the word"
+        freq_attr = freq_obj.attr("data-band")
+        if freq_attr is None:
+            return 0, "Fail to find the word"
+        return int(freq_attr), freq_obj.attr("title")
+    except Exception as err:
+        return 0, str(err)
+
+
+@dataclass
+class CollinsPage:
+    url: str  # requested URL
+    final_url: str  # URL after redirects, from which the suggestion is parsed
+    freq: int
+    freq_note: str
+    error: Optional[str] = None  # None if the page is fetched
+
+
+# Called on a worker thread with the fetched page
+CollinsCallback = Callable[[CollinsPage], None]
+
+
+class CollinsFetcher:
+    """
+    Fetch Collins pages over plain HTTP, without rendering them, and parse the frequency on worker threads. At most
+    max_connections requests are in flight. Each worker thread keeps its own keep-alive connection per host, so the
+    connections are reused across words and bounded by max_connections too.
+    """
+
+    USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_3) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/13.0.5 Safari/605.1.15"
+    MAX_REDIRECTS = 5
+
+    def __init__(self, max_connections: int = 4, timeout: float = 10):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="collins")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[http.client.HTTPConnection] = []  # of all threads, to be closed on shutdown
+
+    def fetch(self, url: str, done: Optional[CollinsCallback] = None) -> Future:
+        """
+        Queue a fetch of the page and return immediately.
+        :return: Future resolving to the CollinsPage
+        """
+        future = self._pool.submit(self._fetch, url)
+        if done is not None:
+            future.add_done_callback(lambda f: None if f.cancelled() else done(f.result()))
+        return future
+
+    def shutdown(self) -> None:
+        """Cancel queued fetches and abort those in flight."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    def _fetch(self, url: str) -> CollinsPage:
+        try:
+            final_url, html = self._get(url)
+        except (OSError, http.client.HTTPException, RuntimeError) as err:
+            return CollinsPage(url, url, 0, str(err), str(err) or type(err).__name__)
+        freq, note = parse_collins_freq(html)
+        return CollinsPage(url, final_url, freq, note)
+
+    def _get(self, url: str) -> Tuple[str, str]:
+        """Get the page following redirects. Return (final URL, html)."""
+        for _ in range(self.MAX_REDIRECTS + 1):
+            status, location, body = self._request(url)
+            if status in (301, 302, 303, 307, 308) and location is not None:
+                url = urljoin(url, location)
+                continue
+            if status != 200:
+                raise RuntimeError("HTTP %d from %s" % (status, url))
+            return url, body
+        raise RuntimeError("Too many redirects from %s" % url)
+
+    def _request(self, url: str) -> Tuple[int, Optional[str], str]:
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query != "":
+            path += "?" + parts.query
+        for retry in [False, True]:
+            conn = self._connection(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", path, headers={"User-Agent": self.USER_AGENT, "Accept": "text/html"})
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._drop_connection(parts.scheme, parts.netloc)
+                if retry:
+                    raise
+                continue  # the server closed the idle keep-alive connection
+            except (OSError, http.client.HTTPException):
+                self._drop_connection(parts.scheme, parts.netloc)  # e.g. timed out in the middle of a response
+                raise
+            charset = response.headers.get_content_charset() or "utf-8"
+            return response.status, response.getheader("Location"), body.decode(charset, errors="replace")
+
+    def _connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        """Return the connection of the current thread to the host."""
+        connections: Dict[Tuple[str, str], http.client.HTTPConnection] = self._local.__dict__.setdefault(
+            "connections", {})
+        conn = connections.get((scheme, netloc))
+        if conn is None:
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+            else:
+                conn = http.client.HTTPConnection(netloc, timeout=self.timeout)
+            connections[(scheme, netloc)] = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _drop_connection(self, scheme: str, netloc: str) -> None:
+        conn = self._local.__dict__.get("connections", {}).pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+            with self._lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
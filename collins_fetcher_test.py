@@ -0,0 +1,112 @@
+import time
+import threading
+from unittest import TestCase
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collins_fetcher import *
+
+PAGES = {
+    "/dictionary/english/run": '<html><body><h2>run</h2><span class="word-frequency-img" data-band="5" '
+                               'title="Extremely Common. run is one of the 1000 most commonly used words in the Collins '
+                               'dictionary"></span></body></html>',
+    "/spellcheck/english?q=qwerty": "<html><body>Sorry, no results for qwerty</body></html>",
+}
+REDIRECTS = {
+    "/dictionary/english/ran": "/dictionary/english/run",
+    "/dictionary/english/qwerty": "/spellcheck/english?q=qwerty",
+}
+
+
+class CollinsStandIn(BaseHTTPRequestHandler):
+    """Serve canned Collins pages over keep-alive connections, counting connections and concurrent requests."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.in_flight -= 1
+
+        if self.path in REDIRECTS:
+            self.send_response(301)
+            self.send_header("Location", REDIRECTS[self.path])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path in PAGES:
+            body = PAGES[self.path].encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        if self.server.drop_idle:
+            self.close_connection = True  # close without telling the client, as servers do to idle connections
+
+    def log_message(self, *args):
+        pass
+
+
+class CollinsFetcherTest(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), CollinsStandIn)
+        self.server.lock = threading.Lock()
+        self.server.connections = 0
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        self.server.delay = 0
+        self.server.drop_idle = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = "http://127.0.0.1:%d/dictionary/english/" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_redirect_and_freq(self):
+        fetcher = CollinsFetcher()
+        page = fetcher.fetch(self.base + "ran").result()
+        self.assertIsNone(page.error)
+        self.assertEqual(self.base + "run", page.final_url)
+        self.assertEqual(5, page.freq)
+        self.assertTrue(page.freq_note.startswith("Extremely Common"))
+
+        page = fetcher.fetch(self.base + "qwerty").result()
+        self.assertIsNone(page.error)
+        self.assertFalse(page.final_url.startswith(self.base))  # no suggestion
+        self.assertEqual((0, "Fail to find the word"), (page.freq, page.freq_note))
+
+        page = fetcher.fetch(self.base + "missing").result()
+        self.assertIsNotNone(page.error)
+        fetcher.shutdown()
+
+    def test_connection_pooling_and_limit(self):
+        self.server.delay = 0.01
+        fetcher = CollinsFetcher(max_connections=2)
+        pages = []
+        futures = [fetcher.fetch(self.base + "run", pages.append) for _ in range(20)]
+        for future in futures:
+            future.result()
+        self.assertEqual(20, len([p for p in pages if p.freq == 5]))
+        self.assertLessEqual(self.server.max_in_flight, 2)
+        self.assertLessEqual(self.server.connections, 2)
+        fetcher.shutdown()
+
+    def test_reconnect_after_idle_close(self):
+        self.server.drop_idle = True
+        fetcher = CollinsFetcher(max_connections=1)
+        for _ in range(3):
+            page = fetcher.fetch(self.base + "run").result()
+            self.assertIsNone(page.error)
+            self.assertEqual(5, page.freq)
+        fetcher.shutdown()
@@ -3,10 +3,38 @@
 import subprocess
 import tempfile
 import os
+import glob
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Optional, List, Callable
+from media_cache import MediaCache
 import bundle_files
 
+# Build the argv to synthesize speech of (word, speaker) into an audio file (the last argument)
+TTSCommand = Callable[[str, str, str], List[str]]
+# Build the argv to encode an audio file (the first argument) into an mp3 file (the second argument)
+EncodeCommand = Callable[[str, str], List[str]]
+
+
+def say_command(word: str, speaker: str, audio_file: str) -> List[str]:
+    return ["say", "-v", speaker, "-r", "175", "-o", audio_file, word]
+
+
+def espeak_command(word: str, speaker: str, audio_file: str) -> List[str]:
+    return ["espeak", "-v", speaker, "-w", audio_file, word]
+
+
+def lame_command(audio_file: str, mp3_file: str) -> List[str]:
+    return [bundle_files.lame_filename, "-m", "m", audio_file, mp3_file]
+
 
 class DataExporter:
+    """
+    Export confirmed entries as a TSV file to be imported to Anki.
+    Entries and retractions are appended to a journal next to the output file, keyed by an entry ID given by the
+    caller. The journal is compacted into the output file on close_file() or compact(). Journals left over by a crash
+    are compacted by recover_journals().
+    """
+
     OUTPUT_DELIMITER = "\t"
     OUTPUT_ESCAPES = {
         "\n": "<br>",
@@ -14,19 +42,38 @@ class DataExporter:
         # ";": "&#59;"
     }
 
-    def __init__(self, media_path: str):
+    JOURNAL_SUFFIX = ".journal"
+    JOURNAL_WRITE = "+"
+    JOURNAL_RETRACT = "-"
+
+    MEDIA_WORKERS = 4  # concurrent synthesis jobs
+
+    def __init__(self, media_path: str, tts_command: TTSCommand = say_command,
+                 encode_command: EncodeCommand = lame_command,
+                 media_failed: Optional[Callable[[str, str], None]] = None,
+                 media_cache: Optional[MediaCache] = None):
+        """
+        :param media_path: Directory to put generated media files
+        :param tts_command: Command to synthesize speech
+        :param encode_command: Command to encode synthesized speech into mp3
+        :param media_failed: Callback of (word, error message) when media generation fails. Called on a worker thread.
+        :param media_cache: Cache to reuse media generated before, which must share the same media_path
+        """
         self.media_path = media_path
-        self.temp_media_file = os.path.join(tempfile.gettempdir(), "isay.aiff")
-        self.f = None
+        self.f = None  # journal file
+        self.output_file: Optional[str] = None
+        self.entries: Dict[str, str] = {}  # entry ID -> output line, in the order of writing
 
-        self.media_proc = None
+        self.tts_command = tts_command
+        self.encode_command = encode_command
+        self.media_failed = media_failed
+        self.media_pool = ThreadPoolExecutor(max_workers=self.MEDIA_WORKERS, thread_name_prefix="media")
+        self.media_jobs: Dict[str, Future] = {}  # mp3 filename -> future resolving to the filename
+        self.media_cache = media_cache
+        self.pending_media: Dict[str, str] = {}  # cache key -> mp3 filename of jobs not finished yet
 
     def __del__(self):
-        if self.media_proc is not None:
-            # Wait for completion of media generation
-            self.media_proc: subprocess.Popen
-            self.media_proc.wait()
-            assert self.media_proc.returncode == 0, "Fail to generate media"
+        self.finish_media()
         if self.file_opened():
             self.close_file()
 
@@ -49,35 +96,139 @@ class DataExporter:
         )
 
     def generate_media(self, word: str, speaker: str) -> str:
-        if self.media_proc is not None:
-            self.media_proc: subprocess.Popen
-            self.media_proc.wait()
-            assert self.media_proc.returncode == 0, "Fail to generate media"
-
-        filename = DataExporter.new_random_filename("mp3")
-        say_command = " ".join(["say", "-v", '"%s"' % speaker, "-r", "175", "-o", '"%s"' % self.temp_media_file, '"%s"' % word])
-        lame_command = " ".join(
-            [f'"{bundle_files.lame_filename}"', '-m', 'm', '"%s"' % self.temp_media_file, '"%s/%s"' % (self.media_path, filename)])
-        self.media_proc = subprocess.Popen(say_command + " && " + lame_command,
-                                           shell=True,
-                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)  # non-blocking
+        """
+        Queue generation of the pronunciation mp3 and return its filename immediately. The file appears in media_path
+        once the job resolves. See media_jobs for the futures. If the same text has been generated with the same
+        commands before (or is being generated), the existing filename is returned instead.
+        """
+        word = MediaCache.normalize_text(word)
+
+        key = None
+        if self.media_cache is not None:
+            key = MediaCache.make_key(self.tts_command(word, speaker, "<audio>"), self.encode_command("<audio>", "<mp3>"))
+            filename = self.pending_media.get(key)
+            if filename is not None:
+                return filename
+            filename = self.media_cache.get(key)
+            if filename is not None:
+                if filename not in self.media_jobs:
+                    future = Future()
+                    future.set_result(filename)
+                    self.media_jobs[filename] = future
+                return filename
+            self.pending_media[key] = filename = DataExporter.new_random_filename("mp3")
+        else:
+            filename = DataExporter.new_random_filename("mp3")
+
+        future = self.media_pool.submit(self._synthesize, word, speaker, filename)
+        future.add_done_callback(lambda f: self._handle_media_done(word, key, f))
+        self.media_jobs[filename] = future
+        return filename
+
+    def finish_media(self) -> None:
+        """Wait for all queued media jobs and save the cache. No more media can be generated afterwards."""
+        self.media_pool.shutdown(wait=True)
+        if self.media_cache is not None:
+            self.media_cache.save()
+
+    def _synthesize(self, word: str, speaker: str, filename: str) -> str:
+        """Run on a worker thread. Each job synthesizes into its own temporary file."""
+        fd, audio_file = tempfile.mkstemp(suffix=".aiff", prefix="isay-")
+        os.close(fd)
+        try:
+            for command in [self.tts_command(word, speaker, audio_file),
+                            self.encode_command(audio_file, os.path.join(self.media_path, filename))]:
+                p = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                if p.returncode != 0:
+                    raise RuntimeError(f"{command[0]} exited with {p.returncode}: "
+                                       f"{p.stderr.decode('utf-8', errors='replace').strip()}")
+        finally:
+            os.remove(audio_file)
         return filename
 
+    def _handle_media_done(self, word: str, key: Optional[str], future: Future) -> None:
+        err = future.exception()
+        if key is not None:
+            if err is None:
+                self.media_cache.put(key, future.result())
+            self.pending_media.pop(key, None)
+        if err is not None and self.media_failed is not None:
+            self.media_failed(word, str(err))
+
     @staticmethod
     def pronounce(word: str, speaker: str) -> None:
         subprocess.Popen(["say", "-v", speaker, "-r", "175", word])  # non-blocking
 
     def open_file(self, output_file: str) -> None:
+        """Open the journal of the output file. If a journal is left over (e.g. after a crash), it is replayed."""
         assert self.f is None, "A file is already opened"
-        self.f = open(output_file, "w", encoding="utf-8")
+        self.output_file = output_file
+        journal_file = output_file + self.JOURNAL_SUFFIX
+        self.entries = {}
+        if os.path.exists(journal_file):
+            self.entries = self._read_journal(journal_file)
+            # Rewrite the journal, as a line appended to a torn one would be merged with it
+            self._write_output(journal_file, {entry_id: self.OUTPUT_DELIMITER.join([self.JOURNAL_WRITE, entry_id, line])
+                                              for entry_id, line in self.entries.items()})
+        self.f = open(journal_file, "a", encoding="utf-8")
+
+    @classmethod
+    def recover_journals(cls, directory: str, pattern: str = "*") -> List[str]:
+        """
+        Compact journals left over in the directory (e.g. after a crash) into their output files matching the pattern,
+        and remove the journals. Must not be called while any of them is opened. Can throw OSError.
+        :return: output files recovered
+        """
+        recovered = []
+        for journal_file in sorted(glob.glob(os.path.join(glob.escape(directory), pattern + cls.JOURNAL_SUFFIX))):
+            output_file = journal_file[:-len(cls.JOURNAL_SUFFIX)]
+            cls._write_output(output_file, cls._read_journal(journal_file))
+            os.remove(journal_file)
+            recovered.append(output_file)
+        return recovered
+
+    @classmethod
+    def _read_journal(cls, journal_file: str) -> Dict[str, str]:
+        """
+        Replay the journal and return the entries not retracted. Malformed lines, e.g. the last one torn by a crash
+        while being written, are skipped.
+        """
+        entries = {}
+        with open(journal_file, "r", encoding="utf-8") as f:
+            for line in f:  # split on "\n" only, unlike str.splitlines(), as entries may contain e.g. U+2028
+                if not line.endswith("\n"):
+                    break  # torn
+                fields = line[:-1].split(cls.OUTPUT_DELIMITER, 2)
+                if fields[0] == cls.JOURNAL_WRITE and len(fields) == 3:
+                    entries[fields[1]] = fields[2]
+                elif fields[0] == cls.JOURNAL_RETRACT and len(fields) == 2:
+                    entries.pop(fields[1], None)
+        return entries
+
+    @staticmethod
+    def _write_output(output_file: str, entries: Dict[str, str]) -> None:
+        """Write the entries to the output file, replacing it atomically."""
+        temp_file = output_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            for line in entries.values():
+                f.write(line + "\n")
+        os.replace(temp_file, output_file)
 
     def file_opened(self) -> bool:
         return self.f is not None
 
     def close_file(self) -> None:
+        """Compact the journal into the output file, and remove the journal."""
         if self.f is not None:
+            self.compact()
             self.f.close()
             self.f = None
+            os.remove(self.output_file + self.JOURNAL_SUFFIX)
+
+    def compact(self) -> None:
+        """Write all entries not retracted to the output file, replacing it atomically."""
+        assert self.file_opened(), "No file opened"
+        self._write_output(self.output_file, self.entries)
 
     def escape_str(self, s: str):
         ret = s
@@ -85,10 +236,12 @@ class DataExporter:
             ret = ret.replace(k, v)
         return ret
 
-    def write_entry(self, subject: str, pronunciation: str, paraphrase: str, extension: str, example: str, hint: str,
-                    freq: int, has_r: str, has_s: str, has_d: str):
+    def write_entry(self, entry_id: str, subject: str, pronunciation: str, paraphrase: str, extension: str,
+                    example: str, hint: str, freq: int, has_r: str, has_s: str, has_d: str):
+        """Write an entry. entry_id must not contain the delimiter and is used to retract the entry later."""
         assert self.file_opened(), "No file opened"
-        self.f.write(self.OUTPUT_DELIMITER.join([
+        assert entry_id not in self.entries, "Entry ID already written"
+        line = self.OUTPUT_DELIMITER.join([
             self.escape_str(subject),
             self.escape_str(pronunciation),
             self.escape_str(paraphrase),
@@ -99,29 +252,15 @@ class DataExporter:
             self.escape_str(has_r),
             self.escape_str(has_s),
             self.escape_str(has_d)
-        ]) + "\n")
+        ])
+        self.entries[entry_id] = line
+        self.f.write(self.OUTPUT_DELIMITER.join([self.JOURNAL_WRITE, entry_id, line]) + "\n")
         self.f.flush()
 
-    def retract_subject(self, subject: str) -> None:
+    def retract_entry(self, entry_id: str) -> None:
+        """Retract an entry written before by appending a tombstone to the journal."""
         assert self.file_opened(), "No file opened"
-        output_file = self.f.name
-
-        # Close the output file
-        self.close_file()
-
-        # Read all lines and delete the specific line
-        with open(output_file, "r", encoding="utf-8") as f:
-            lines = f.read().splitlines()
-
-        line_num = -1
-        for i in range(len(lines)):
-            if lines[i].startswith(self.escape_str(subject) + self.OUTPUT_DELIMITER):
-                line_num = i
-                break
-        assert line_num != -1, "Fail to find the line of given subject"
-        del lines[line_num]
-
-        # Re-open the output file and write back the revised content
-        self.open_file(output_file)
-        self.f.write("\n".join(lines) + "\n")
+        assert entry_id in self.entries, "Fail to find the entry of given ID"
+        del self.entries[entry_id]
+        self.f.write(self.OUTPUT_DELIMITER.join([self.JOURNAL_RETRACT, entry_id]) + "\n")
         self.f.flush()
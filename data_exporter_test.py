@@ -0,0 +1,168 @@
+import os
+import sys
+import tempfile
+from unittest import TestCase
+from data_exporter import *
+
+
+class DataExporterTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.dir.name, "output.txt")
+        self.exporter = DataExporter(self.dir.name)
+
+    def tearDown(self):
+        self.exporter.close_file()
+        self.dir.cleanup()
+
+    def write(self, entry_id: str, subject: str, hint: str = ""):
+        self.exporter.write_entry(entry_id, subject, "", "", "", "", hint, 0, "1", "", "")
+
+    def read_subjects(self) -> [str]:
+        with open(self.output_file, "r", encoding="utf-8") as f:
+            return [line.split(DataExporter.OUTPUT_DELIMITER)[0] for line in f.read().splitlines()]
+
+    def test_retract_duplicate_subject(self):
+        self.exporter.open_file(self.output_file)
+        self.write("0", "word", hint="first")
+        self.write("1", "word", hint="second")
+        self.exporter.retract_entry("1")
+        self.exporter.close_file()
+        with open(self.output_file, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(1, len(lines))
+        self.assertIn("first", lines[0])
+        self.assertFalse(os.path.exists(self.output_file + DataExporter.JOURNAL_SUFFIX))
+
+    def test_rewrite_after_retract(self):
+        self.exporter.open_file(self.output_file)
+        self.write("0", "a")
+        self.write("1", "b")
+        self.exporter.retract_entry("0")
+        self.write("0", "c")
+        self.exporter.compact()
+        self.assertEqual(["b", "c"], self.read_subjects())
+
+    def test_replay_journal(self):
+        self.exporter.open_file(self.output_file)
+        self.write("0", "a")
+        self.write("1", "b")
+        self.exporter.retract_entry("0")
+        self.exporter.f.close()  # simulate a crash, leaving the journal behind
+        self.exporter.f = None
+
+        self.exporter = DataExporter(self.dir.name)
+        self.exporter.open_file(self.output_file)
+        self.write("2", "c")
+        self.exporter.close_file()
+        self.assertEqual(["b", "c"], self.read_subjects())
+
+    def test_replay_line_separators(self):
+        self.exporter.open_file(self.output_file)
+        self.write("0", "a\u2028b\x0c\x85")  # line boundaries of str.splitlines(), but not of the journal
+        self.write("1", "c")
+        self.exporter.f.close()  # simulate a crash, leaving the journal behind
+        self.exporter.f = None
+
+        self.exporter = DataExporter(self.dir.name)
+        self.exporter.open_file(self.output_file)
+        self.assertEqual(2, len(self.exporter.entries))
+        self.exporter.close_file()
+        with open(self.output_file, "r", encoding="utf-8", newline="\n") as f:
+            self.assertEqual(["a\u2028b\x0c\x85", "c"], [line.split(DataExporter.OUTPUT_DELIMITER)[0] for line in f])
+
+    def test_replay_torn_journal(self):
+        self.exporter.open_file(self.output_file)
+        self.write("0", "a")
+        self.exporter.f.write(DataExporter.JOURNAL_WRITE + DataExporter.OUTPUT_DELIMITER + "1")  # torn by a crash
+        self.exporter.f.close()
+        self.exporter.f = None
+
+        self.exporter = DataExporter(self.dir.name)
+        self.exporter.open_file(self.output_file)
+        self.write("2", "b")
+        self.exporter.f.close()  # crash again
+        self.exporter.f = None
+
+        self.exporter = DataExporter(self.dir.name)
+        self.exporter.open_file(self.output_file)
+        self.exporter.close_file()
+        self.assertEqual(["a", "b"], self.read_subjects())
+
+    def test_recover_journals(self):
+        self.exporter.open_file(self.output_file)
+        self.write("0", "a")
+        self.write("1", "b")
+        self.exporter.retract_entry("0")
+        self.exporter.f.close()  # simulate a crash, leaving the journal behind
+        self.exporter.f = None
+
+        self.assertEqual([self.output_file], DataExporter.recover_journals(self.dir.name, "*.txt"))
+        self.assertEqual(["b"], self.read_subjects())
+        self.assertFalse(os.path.exists(self.output_file + DataExporter.JOURNAL_SUFFIX))
+        self.assertEqual([], DataExporter.recover_journals(self.dir.name, "*.txt"))
+
+
+def _fake_tts_command(word: str, speaker: str, audio_file: str) -> [str]:
+    if word == "fail":
+        return [sys.executable, "-c", "import sys; sys.exit('cannot speak')"]
+    return [sys.executable, "-c", "import sys, time; time.sleep(0.2); open(sys.argv[1], 'w').write(sys.argv[2])",
+            audio_file, "%s/%s" % (speaker, word)]
+
+
+def _fake_encode_command(audio_file: str, mp3_file: str) -> [str]:
+    return [sys.executable, "-c", "import shutil, sys; shutil.copy(sys.argv[1], sys.argv[2])", audio_file, mp3_file]
+
+
+class DataExporterMediaTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.failures = []
+        self.exporter = DataExporter(self.dir.name, tts_command=_fake_tts_command,
+                                     encode_command=_fake_encode_command,
+                                     media_failed=lambda word, info: self.failures.append((word, info)))
+
+    def tearDown(self):
+        self.exporter.finish_media()
+        self.dir.cleanup()
+
+    def test_concurrent_generation(self):
+        words = ["word%d" % i for i in range(DataExporter.MEDIA_WORKERS)]
+        filenames = [self.exporter.generate_media(word, "Alex") for word in words]
+        self.assertEqual(len(set(filenames)), len(filenames))
+        for word, filename in zip(words, filenames):
+            self.assertEqual(filename, self.exporter.media_jobs[filename].result(timeout=10))
+            with open(os.path.join(self.dir.name, filename), "r") as f:
+                self.assertEqual("Alex/" + word, f.read())
+        self.assertEqual([], self.failures)
+
+    def test_failure_reported(self):
+        filename = self.exporter.generate_media("fail", "Alex")
+        self.assertIsNotNone(self.exporter.media_jobs[filename].exception(timeout=10))
+        self.exporter.finish_media()
+        self.assertEqual(1, len(self.failures))
+        self.assertEqual("fail", self.failures[0][0])
+        self.assertIn("cannot speak", self.failures[0][1])
+        self.assertFalse(os.path.exists(os.path.join(self.dir.name, filename)))
+
+    def test_media_cache(self):
+        cache = MediaCache(os.path.join(self.dir.name, "index", "media_cache.json"), self.dir.name)
+        self.exporter = DataExporter(self.dir.name, tts_command=_fake_tts_command, encode_command=_fake_encode_command,
+                                     media_cache=cache)
+        first = self.exporter.generate_media("word", "Alex")
+        self.assertEqual(first, self.exporter.generate_media(" word ", "Alex"))  # pending job is shared
+        self.assertNotEqual(first, self.exporter.generate_media("word", "Daniel"))
+        self.exporter.finish_media()
+
+        # Next session
+        cache = MediaCache(os.path.join(self.dir.name, "index", "media_cache.json"), self.dir.name)
+        self.exporter = DataExporter(self.dir.name, tts_command=_fake_tts_command, encode_command=_fake_encode_command,
+                                     media_cache=cache)
+        self.assertEqual(first, self.exporter.generate_media("word", "Alex"))
+        self.assertEqual(first, self.exporter.media_jobs[first].result())
+        self.assertEqual(1, cache.hits)
+
+        # Media removed from the media directory
+        os.remove(os.path.join(self.dir.name, first))
+        self.assertNotEqual(first, self.exporter.generate_media("word", "Alex"))
+        self.assertEqual(1, cache.misses)
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import csv
+import sqlite3
+import traceback
 from data_source import *
 from data_exporter import *
 from html_cleaner import *
+from media_cache import MediaCache
 from PyQt6 import QtCore, QtGui
 from typing import Optional, List, Dict
 from dataclasses import dataclass
+from datetime import datetime
 from enum import Enum
 
 
@@ -35,22 +40,73 @@ class Record:
     freq_note: str = ""
     cards: str = "R"
     suggestion: Optional[str] = None
-    saved_as_subject: Optional[str] = None
+    saved_entry_id: Optional[str] = None
+
+
+class DataLoader(QtCore.QThread):
+    """
+    Run DB.open() and DB.fetch_all() on a separate thread and post pages of Records back through queued signals.
+    Records posted have placeholder cid, which get assigned when they are inserted into DataManager.
+    Call requestInterruption() to cancel. Loading stops at the next page boundary.
+    """
+
+    page_loaded = QtCore.pyqtSignal(list, int, int)  # [Record], rows_read, total_estimate (0 if unknown)
+    load_failed = QtCore.pyqtSignal(str)  # error message
+
+    def __init__(self, db: DB, parent: Optional[QtCore.QObject] = None):
+        super().__init__(parent)
+        self._db = db
+
+    def run(self) -> None:
+        try:
+            self._db.open()
+            total = self._db.estimate_count(new_only=True)
+            rows_read = 0
+            for page in self._db.fetch_all(new_only=True):
+                if self.isInterruptionRequested():
+                    return
+                records = []
+                for raw in page:
+                    records.append(Record(
+                        cid=-1,  # assigned at insertion
+                        subject=raw["subject"],
+                        db_id=raw["word_id"],
+                        example=raw["usage"].replace(raw["subject"], u"<b>%s</b>" % raw["subject"]),
+                        raw_example=raw["usage"],
+                        source_enabled=(raw["source"] != ""),
+                        source=raw["source"]
+                    ))
+                rows_read += len(records)
+                self.page_loaded.emit(records, rows_read, max(total, rows_read))
+        except (RuntimeError, OSError, UnicodeError, csv.Error, sqlite3.Error) as e:
+            self.load_failed.emit(str(e))
+        except Exception as e:  # an error escaping run() aborts the app
+            traceback.print_exc()
+            self.load_failed.emit("%s: %s" % (type(e).__name__, e))
 
 
 class DataManager(QtCore.QObject):
     record_status_changed = QtCore.pyqtSignal(int, RecordStatus, RecordStatus)  # cid, old_status, new_status
-    record_inserted = QtCore.pyqtSignal(int, bool)  # cid, batch_loading(True)/add_single(False)
+    record_inserted = QtCore.pyqtSignal(int)  # cid of a single entry added
+    records_inserted = QtCore.pyqtSignal(range)  # cids of a page of entries appended by batch loading
     record_cleared = QtCore.pyqtSignal()
     record_count_changed = QtCore.pyqtSignal()
     batch_load_started = QtCore.pyqtSignal()
+    batch_load_progress = QtCore.pyqtSignal(int, int)  # rows_read, total_estimate (0 if unknown)
+    batch_load_failed = QtCore.pyqtSignal(str)  # error message
     batch_load_finished = QtCore.pyqtSignal(bool)  # is_kindle_db
+    media_generation_failed = QtCore.pyqtSignal(str, str)  # word, error message
+    db_commit_failed = QtCore.pyqtSignal(str)  # error message of a deferred commit
+    backup_finished = QtCore.pyqtSignal(str, str)  # source file, archive file ("" if unchanged since the last backup)
+    backup_failed = QtCore.pyqtSignal(str, str)  # source file, error message
 
     def __init__(self, output_path: str, media_path: str):
 
         super().__init__()
 
         self._db: Optional[DB] = None
+        self._loader: Optional[DataLoader] = None
+        self._loading_kindle_db: bool = False
 
         self._records: List[Record] = []
         self._counts: Dict[RecordStatus, int] = {
@@ -63,13 +119,23 @@ class DataManager(QtCore.QObject):
         self._output_path: str = output_path
         self._media_path: str = media_path
         self._exporter: Optional[DataExporter] = None  # lazy construction
+        self._media_cache = MediaCache(os.path.join(DB.DATA_DICT, "media_cache.json"), media_path)
+        self._html_cache = CleanHTMLCache()
+
+        # Coalesce commits of data sources that are expensive to commit. See DB.COMMIT_DELAY_MS.
+        self._pending_changes: int = 0
+        self._commit_timer = QtCore.QTimer(self)
+        self._commit_timer.setSingleShot(True)
+        self._commit_timer.timeout.connect(self._handle_commit_timeout)
 
     def __del__(self):
+        if self._loader is not None:
+            self._loader.requestInterruption()
+            self._loader.wait()
         if self._db is not None:
+            self.flush_changes()
             del self._db
-        if self._exporter is not None:
-            self._exporter.close_file()
-            del self._exporter
+        self.close_output()
 
     def get(self, cid: int) -> Record:
         return self._records[cid]
@@ -80,8 +146,18 @@ class DataManager(QtCore.QObject):
         else:
             return self._counts[status]
 
+    def is_loading(self) -> bool:
+        return self._loader is not None
+
+    def cancel_loading(self) -> None:
+        """Cancel the running batch load, if any. Pages already posted by the loader are discarded."""
+        if self._loader is not None:
+            self._loader.requestInterruption()
+            self._loader = None  # the loader deletes itself when it finishes
+
     def clear(self) -> None:
-        """Clear all records and emit signals."""
+        """Clear all records, cancel the running batch load and emit signals."""
+        self.cancel_loading()
         self._records.clear()
         self._counts = {
             RecordStatus.UNVIEWED: 0,
@@ -93,53 +169,73 @@ class DataManager(QtCore.QObject):
         self.record_count_changed.emit()
 
         # Clear self._exporter to save records to a new file next time
+        self.close_output()
+
+    def close_output(self) -> None:
+        """Compact confirmed records into the output file. Records confirmed afterwards are saved to a new file."""
         if self._exporter is not None:
+            self._exporter.finish_media()
             self._exporter.close_file()
             del self._exporter
             self._exporter = None
 
     def reload_kindle_data(self, db_file: str) -> None:
         """
-        Clear _records and load _records from Kindle.
-        Can throw RuntimeError.
+        Clear _records and start loading _records from Kindle in background.
+        Can throw RuntimeError or OSError. Errors during loading are reported through batch_load_failed.
         :return: True if file exists, False otherwise
         """
         if not os.path.isfile(db_file):
             raise RuntimeError("Failed to find Kindle DB file. Please make sure Kindle has connected.")
 
+        self.cancel_loading()  # the running loader may still be using the old database
+
         # Set up database to KindleDB
         if self._db is not None:
+            self.flush_changes()
             del self._db
             self._db = None
-        self._db = KindleDB(db_file)
+        os.makedirs(DB.DATA_DICT, exist_ok=True)
+        try:
+            self._db = KindleDB(db_file, backup_done=self._handle_backup_done,
+                                snapshot_file=os.path.join(DB.DATA_DICT, KindleDB.SNAPSHOT_FILENAME),
+                                lookups=KindleDB.LOOKUPS_MERGED)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to copy Kindle DB.\n\n{e}")
 
         self._reload_from_db(is_kindle_db=True)
 
     def reload_csv_data(self, csv_file: str) -> None:
         """
-        Clear _records and load _records from CSV file.
-        Can throw RuntimeError.
+        Clear _records and start loading _records from CSV file in background.
+        Can throw RuntimeError or OSError. Errors during loading are reported through batch_load_failed.
         :return: True if file exists, False otherwise
         """
         if not os.path.isfile(csv_file):
             raise RuntimeError("Failed to load CSV file.")
 
+        self.cancel_loading()  # the running loader may still be using the old database
+
         # Setup database to CSV DB
         if self._db is not None:
+            self.flush_changes()
             del self._db
             self._db = None
-        self._db = CsvDB(csv_file)
+        self._db = CsvDB(csv_file, backup_done=self._handle_backup_done)
 
         self._reload_from_db()
 
     def reload_things_list(self, things_list: str) -> None:
         """
-        Clear _records and load _records from given Things list.
-        Can throw RuntimeError.
+        Clear _records and start loading _records from given Things list in background.
+        Can throw RuntimeError or OSError. Errors during loading are reported through batch_load_failed.
         :return: None
         """
+        self.cancel_loading()  # the running loader may still be using the old database
+
         # Setup database to Things DB
         if self._db is not None:
+            self.flush_changes()
             del self._db
             self._db = None
         self._db = ThingsDB(things_list)
@@ -152,84 +248,166 @@ class DataManager(QtCore.QObject):
 
         self.batch_load_started.emit()
 
-        try:
-            raw_record = self._db.fetch_all(new_only=True)
-        except RuntimeError as e:
-            raise e
-
-        for raw in raw_record:
-            r = Record(
-                cid=len(self._records),  # use new index in self._records as cid
-                subject=raw["subject"],
-                db_id=raw["word_id"],
-                example=raw["usage"].replace(raw["subject"], u"<b>%s</b>" % raw["subject"]),
-                raw_example=raw["usage"],
-                source_enabled=(raw["source"] != ""),
-                source=raw["source"]
-            )
+        self._loading_kindle_db = is_kindle_db
+        self._loader = DataLoader(self._db, self)
+        self._loader.page_loaded.connect(self._handle_loader_page)
+        self._loader.load_failed.connect(self._handle_loader_failure)
+        self._loader.finished.connect(self._handle_loader_finished)
+        self._loader.finished.connect(self._loader.deleteLater)
+        self._loader.start()
+
+    @QtCore.pyqtSlot(list, int, int)
+    def _handle_loader_page(self, records: List[Record], rows_read: int, total_estimate: int) -> None:
+        if self.sender() is not self._loader:
+            return  # page posted by a cancelled loader
+
+        first_cid = len(self._records)
+        for r in records:
+            r.cid = len(self._records)  # use new index in self._records as cid
             self._records.append(r)
-            self.record_inserted.emit(r.cid, True)
+        self._counts[RecordStatus.UNVIEWED] += len(records)
+        self.records_inserted.emit(range(first_cid, len(self._records)))
+
+        self.record_count_changed.emit()
+        self.batch_load_progress.emit(rows_read, total_estimate)
 
-        self._counts[RecordStatus.UNVIEWED] = len(self._records)
-        self._counts[RecordStatus.TOPROCESS] = self._counts[RecordStatus.CONFIRMED] = self._counts[
-            RecordStatus.DISCARDED] = 0
+    @QtCore.pyqtSlot(str)
+    def _handle_loader_failure(self, info: str) -> None:
+        if self.sender() is not self._loader:
+            return
+        self._loader = None
+        self.batch_load_failed.emit(info)
+
+    @QtCore.pyqtSlot()
+    def _handle_loader_finished(self) -> None:
+        if self.sender() is not self._loader:
+            return  # cancelled or failed
+        self._loader = None
 
         self.record_count_changed.emit()  # need to be ahead of batch_load_finished to enable editor
 
-        self.batch_load_finished.emit(is_kindle_db)
+        self.batch_load_finished.emit(self._loading_kindle_db)
 
     def set_status(self, cid: int, status: RecordStatus, without_commit: bool = False) -> None:
         """Set record status."""
 
+        category = self._update_status(cid, status)
+        if category is not None:
+            self._db.set_word_mature_without_commit(self._records[cid].db_id, category)
+            if not without_commit:
+                self._request_commit()
+
+        self.record_count_changed.emit()
+
+    def set_statuses(self, cids: List[int], status: RecordStatus) -> None:
+        """Set status of records in bulk. Changes of the data source are made in batches and committed at once."""
+
+        word_ids: Dict[int, List[str]] = {0: [], 100: []}  # category -> word IDs
+        for cid in cids:
+            category = self._update_status(cid, status)
+            if category is not None:
+                word_ids[category].append(self._records[cid].db_id)
+
+        if len(word_ids[0]) > 0 or len(word_ids[100]) > 0:
+            for category, ids in word_ids.items():
+                if len(ids) > 0:
+                    self._db.set_words_mature_without_commit(ids, category)
+            self._pending_changes += 1
+            self.flush_changes()
+
+        self.record_count_changed.emit()
+
+    def _update_status(self, cid: int, status: RecordStatus) -> Optional[int]:
+        """
+        Update record status, save or retract the entry and emit record_status_changed.
+        :return: Category to set to the data source, or None if the data source is not changed
+        """
+
         r = self._records[cid]
         # Even if the state is the same, we still do retract-save process since some entry may have been changed
 
         old_status = r.status
+        category = None
 
         if old_status in [RecordStatus.CONFIRMED, RecordStatus.DISCARDED] and status in [RecordStatus.UNVIEWED,
                                                                                          RecordStatus.TOPROCESS]:
-            if self._db is not None and r.db_id is not None:
-                self._db.set_word_mature_without_commit(r.db_id, 0)  # retract db status
-                if not without_commit:
-                    self._db.commit_changes()
+            category = 0  # retract db status
 
         if old_status == RecordStatus.CONFIRMED:  # regardless of new status
             if self._exporter is not None:
-                self._exporter.retract_subject(r.saved_as_subject)
-                r.saved_as_subject = None
+                self._exporter.retract_entry(r.saved_entry_id)
+                r.saved_entry_id = None
 
         self._counts[old_status] -= 1
         r.status = status
         self._counts[status] += 1
 
-        # Save record and commit changes
+        # Save record
         if status == RecordStatus.CONFIRMED:
             if self._exporter is None:
                 self._construct_exporter()
             self._save_entry(cid)
 
         if status in [RecordStatus.CONFIRMED, RecordStatus.DISCARDED]:
-            if self._db is not None and r.db_id is not None:
-                self._db.set_word_mature_without_commit(r.db_id, 100)
-                if not without_commit:
-                    self._db.commit_changes()
+            category = 100
 
         self.record_status_changed.emit(cid, old_status, status)
-        self.record_count_changed.emit()
+
+        if self._db is None or r.db_id is None:
+            return None
+        return category
+
+    def _handle_backup_done(self, file: str, archive: Optional[str], err: Optional[str]) -> None:
+        # Called on the backup thread. The signals get queued to receivers.
+        if err is not None:
+            self.backup_failed.emit(file, err)
+        else:
+            self.backup_finished.emit(file, archive if archive is not None else "")
+
+    def _request_commit(self) -> None:
+        self._pending_changes += 1
+        if self._db.COMMIT_DELAY_MS == 0 or self._pending_changes >= self._db.COMMIT_BATCH_SIZE:
+            self.flush_changes()
+        elif not self._commit_timer.isActive():
+            self._commit_timer.start(self._db.COMMIT_DELAY_MS)
+
+    def flush_changes(self) -> None:
+        """Commit changes of the data source not committed yet. Can throw RuntimeError or OSError."""
+        self._commit_timer.stop()
+        if self._pending_changes > 0 and self._db is not None:
+            self._db.commit_changes()
+            self._pending_changes = 0  # only once committed, so that a failed commit is retried by the next flush
+
+    @QtCore.pyqtSlot()
+    def _handle_commit_timeout(self) -> None:
+        try:
+            self.flush_changes()
+        except (RuntimeError, OSError) as e:
+            self.db_commit_failed.emit(str(e))
+
+    def recover_exports(self) -> List[str]:
+        """
+        Compact exports left journaled by a crashed session into their output files. Call before saving any entry.
+        Can throw OSError.
+        :return: output files recovered
+        """
+        return DataExporter.recover_journals(self._output_path, "maple-*.txt")
 
     def _construct_exporter(self) -> None:
         save_file = "%s/maple-%s.txt" % (self._output_path, datetime.now().strftime('%Y-%m-%d-%H%M%S'))
-        self._exporter = DataExporter(self._media_path)
+        # media_generation_failed is emitted from a media worker thread and gets queued to receivers
+        self._exporter = DataExporter(self._media_path, media_failed=self.media_generation_failed.emit,
+                                      media_cache=self._media_cache)
         self._exporter.open_file(save_file)
 
     def _save_entry(self, cid: int) -> None:
         r = self._records[cid]
 
-        example = clean_html(r.example)
+        example = self._html_cache.clean(r.example)
         if r.source_enabled and r.source != "":
             example += "<br>" + r.source
         mp3 = self._exporter.generate_media(r.subject, r.pronunciation) if r.pronunciation != "Unknown" else ""
-        paraphrase = clean_html(r.paraphrase)
+        paraphrase = self._html_cache.clean(r.paraphrase)
         if r.image is not None:
 
             img_file = self._exporter.new_random_filename("png")
@@ -240,10 +418,12 @@ class DataManager(QtCore.QObject):
             r.image.save(os.path.join(self._exporter.media_path, img_file))
             paraphrase += '<div><br><img src="%s"><br></div>' % img_file
 
-        self._exporter.write_entry(r.subject,
+        entry_id = str(cid)  # cids are unique within an exporter, which is reconstructed on clear()
+        self._exporter.write_entry(entry_id,
+                                   r.subject,
                                    "[sound:%s]" % mp3,
                                    paraphrase,
-                                   clean_html(r.extension),
+                                   self._html_cache.clean(r.extension),
                                    example,
                                    r.hint,
                                    r.freq,
@@ -251,7 +431,7 @@ class DataManager(QtCore.QObject):
                                    "1" if "S" in r.cards else "",
                                    "1" if "D" in r.cards else "")
 
-        r.saved_as_subject = r.subject
+        r.saved_entry_id = entry_id
 
     def add_new_single_entry(self, subject: str = "", example: str = "", source_enabled: bool = False,
                              source: str = '<div align="right" style="font-size:12px"></div>') -> int:
@@ -268,10 +448,18 @@ class DataManager(QtCore.QObject):
         ))
 
         self._counts[RecordStatus.UNVIEWED] += 1
-        self.record_inserted.emit(cid, False)
+        self.record_inserted.emit(cid)
         self.record_count_changed.emit()
         return cid
 
+    def media_cache_stats(self) -> dict:
+        """Return hits, misses, entries and bytes of the pronunciation media cache."""
+        return self._media_cache.stats()
+
+    def html_cache_stats(self) -> dict:
+        """Return hits, misses and entries of the memo of cleaned rich text."""
+        return self._html_cache.stats()
+
     @staticmethod
     def pronounce(word: str, speaker: str) -> None:
         DataExporter.pronounce(word, speaker)
@@ -288,9 +476,6 @@ class DataManager(QtCore.QObject):
                 })
         things_db.add_words_back(reconstructed_records)
 
-        # Set DISCARDED only if add_words_back above goes through
-        for cid, r in enumerate(self._records):
-            if r.status in [RecordStatus.UNVIEWED, RecordStatus.TOPROCESS]:
-                self.set_status(cid, RecordStatus.DISCARDED, without_commit=True)
-        # Commit changes all at once
-        self._db.commit_changes()
+        # Set DISCARDED only if add_words_back above goes through, committing changes all at once
+        self.set_statuses([cid for cid, r in enumerate(self._records)
+                           if r.status in [RecordStatus.UNVIEWED, RecordStatus.TOPROCESS]], RecordStatus.DISCARDED)
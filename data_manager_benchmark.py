@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+# Benchmark of inserting batch-loaded records into the entry list.
+# Run: QT_QPA_PLATFORM=offscreen python data_manager_benchmark.py
+
+import sys
+import time
+from PyQt6 import QtCore, QtWidgets
+from data_manager import DataManager, Record
+from record_list_model import RecordListModel, RecordFilterProxyModel
+
+
+class _Emitter(QtCore.QObject):
+    record_inserted = QtCore.pyqtSignal(int, bool)  # per-record signal emitted before batching
+    records_inserted = QtCore.pyqtSignal(range)
+
+
+class _EntryList:
+    """Mirror of the entry list handlers in MapleUtility, before and after batching."""
+
+    def __init__(self, subjects: [str], uniform_item_sizes: bool):
+        self.subjects = subjects
+        self.entryList = QtWidgets.QListWidget()
+        self.entryList.setUniformItemSizes(uniform_item_sizes)
+        self.entryList.show()
+        self.cid_to_item = {}
+
+    def handle_record_insertion(self, cid: int, batch_loading: bool):
+        subject = self.subjects[cid]
+        self.entryList.selectionModel().blockSignals(True)
+        row = self.entryList.count()
+        self.entryList.insertItem(row, subject)
+        item = self.entryList.item(row)
+        item.setData(QtCore.Qt.ItemDataRole.UserRole, cid)
+        self.cid_to_item[cid] = item
+        self.entryList.selectionModel().blockSignals(False)
+
+    def handle_records_insertion(self, cids: range):
+        self.entryList.setUpdatesEnabled(False)
+        self.entryList.selectionModel().blockSignals(True)
+        for cid in cids:
+            item = QtWidgets.QListWidgetItem(self.subjects[cid])
+            item.setData(QtCore.Qt.ItemDataRole.UserRole, cid)
+            self.entryList.addItem(item)
+            self.cid_to_item[cid] = item
+        self.entryList.selectionModel().blockSignals(False)
+        self.entryList.setUpdatesEnabled(True)
+
+
+class _ModelEntryList:
+    """Mirror of the entry list in MapleUtility using RecordListModel."""
+
+    def __init__(self, subjects: [str]):
+        self.data = DataManager("", "")
+        self.data._records = [Record(cid=cid, subject=subject) for cid, subject in enumerate(subjects)]
+        self.entryList = QtWidgets.QListView()
+        self.entryList.setLayoutMode(QtWidgets.QListView.LayoutMode.Batched)
+        self.entryList.setUniformItemSizes(True)
+        self.entry_model = RecordListModel(self.data, self.entryList.font())
+        self.entry_proxy = RecordFilterProxyModel()
+        self.entry_proxy.setSourceModel(self.entry_model)
+        self.entryList.setModel(self.entry_proxy)
+        self.entryList.show()
+
+    def handle_records_insertion(self, cids: range):
+        self.entryList.selectionModel().blockSignals(True)
+        self.entry_model.append_cids(cids)
+        self.entryList.selectionModel().blockSignals(False)
+
+
+def bench(n: int, page_size: int = 200) -> (float, float, float):
+    subjects = ["word%d" % i for i in range(n)]
+
+    # Before: one signal and one widget insertion per record
+    emitter = _Emitter()
+    target = _EntryList(subjects, uniform_item_sizes=False)
+    emitter.record_inserted.connect(target.handle_record_insertion)
+    start = time.perf_counter()
+    for cid in range(n):
+        emitter.record_inserted.emit(cid, True)
+    QtCore.QCoreApplication.processEvents()
+    before = time.perf_counter() - start
+
+    # After: one signal per page, repainting the list after each page
+    emitter = _Emitter()
+    target = _EntryList(subjects, uniform_item_sizes=True)
+    emitter.records_inserted.connect(target.handle_records_insertion)
+    start = time.perf_counter()
+    for first in range(0, n, page_size):
+        emitter.records_inserted.emit(range(first, min(first + page_size, n)))
+        QtCore.QCoreApplication.processEvents()
+    after = time.perf_counter() - start
+
+    # Model/view: one signal per page, no per-item widget allocation
+    emitter = _Emitter()
+    target = _ModelEntryList(subjects)
+    emitter.records_inserted.connect(target.handle_records_insertion)
+    start = time.perf_counter()
+    for first in range(0, n, page_size):
+        emitter.records_inserted.emit(range(first, min(first + page_size, n)))
+        QtCore.QCoreApplication.processEvents()
+    model = time.perf_counter() - start
+
+    return before, after, model
+
+
+if __name__ == '__main__':
+    app = QtWidgets.QApplication(sys.argv)
+    print("%8s %12s %12s %12s" % ("records", "before [s]", "after [s]", "model [s]"))
+    for count in [1000, 10000, 50000]:
+        b, a, m = bench(count)
+        print("%8d %12.3f %12.3f %12.3f" % (count, b, a, m))
@@ -0,0 +1,83 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt6 import QtCore, QtWidgets
+from data_manager import *
+
+
+class DataLoaderTest(TestCase):
+    def setUp(self):
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])  # shared with widget tests
+        self.dir = tempfile.TemporaryDirectory()
+        self.data_dict = DB.DATA_DICT
+        DB.DATA_DICT = self.dir.name  # keep backups out of the user config directory
+
+    def tearDown(self):
+        DB.backups.wait()
+        DB.DATA_DICT = self.data_dict
+        self.dir.cleanup()
+
+    def load(self, content: bytes) -> (list, list):
+        csv_file = os.path.join(self.dir.name, "words.csv")
+        with open(csv_file, "wb") as f:
+            f.write(content)
+        loader = DataLoader(CsvDB(csv_file))
+        pages, errors = [], []
+        loader.page_loaded.connect(lambda records, rows_read, total: pages.append(records))
+        loader.load_failed.connect(errors.append)
+        loop = QtCore.QEventLoop()
+        loader.finished.connect(loop.quit)
+        loader.start()
+        loop.exec()
+        QtCore.QCoreApplication.processEvents()  # deliver queued signals
+        return pages, errors
+
+    def test_load(self):
+        pages, errors = self.load(b"Word,Usage,Title,Author,Category,Unit\na,usage of a,Book,Author,0,\n")
+        self.assertEqual([], errors)
+        self.assertEqual(["a"], [r.subject for page in pages for r in page])
+
+    def test_non_utf8_file_fails_without_aborting(self):
+        pages, errors = self.load(b"Word,Usage,Title,Author,Category,Unit\n\xff,usage,Book,Author,0,\n")
+        self.assertEqual(1, len(errors))
+
+
+class DataManagerTest(TestCase):
+    def setUp(self):
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])  # shared with widget tests
+        self.dir = tempfile.TemporaryDirectory()
+        self.data_dict = DB.DATA_DICT
+        DB.DATA_DICT = self.dir.name  # keep the media cache out of the user config directory
+
+    def tearDown(self):
+        DB.DATA_DICT = self.data_dict
+        self.dir.cleanup()
+
+    def test_recover_exports_after_crash(self):
+        data = DataManager(self.dir.name, self.dir.name)
+        cid = data.add_new_single_entry("word")
+        data.set_status(cid, RecordStatus.CONFIRMED)
+        output_file = data._exporter.output_file
+        data._exporter.f.close()  # simulate a crash, leaving the journal behind
+        data._exporter.f = None
+        data._exporter.finish_media()
+        self.assertFalse(os.path.exists(output_file))
+
+        data = DataManager(self.dir.name, self.dir.name)  # restart
+        self.assertEqual([output_file], data.recover_exports())
+        with open(output_file, "r", encoding="utf-8") as f:
+            self.assertEqual(["word"], [line.split(DataExporter.OUTPUT_DELIMITER)[0] for line in f])
+        self.assertFalse(os.path.exists(output_file + DataExporter.JOURNAL_SUFFIX))
+
+    def test_flush_retries_failed_commit(self):
+        data = DataManager(self.dir.name, self.dir.name)
+        data._db = mock.Mock()
+        data._db.commit_changes.side_effect = [OSError("disk full"), None]
+        data._pending_changes = 1
+        self.assertRaises(OSError, data.flush_changes)
+        data.flush_changes()  # retried
+        self.assertEqual(2, data._db.commit_changes.call_count)
+        data.flush_changes()  # nothing left to commit
+        self.assertEqual(2, data._db.commit_changes.call_count)
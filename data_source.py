@@ -3,9 +3,15 @@
 
 import sqlite3
 import os
-from datetime import datetime
-import subprocess
+import io
+import csv
+import threading
+from array import array
+from itertools import groupby
 from abc import ABC, abstractmethod
+from typing import Iterator, List, Dict, Tuple, Optional
+from script_runner import ScriptRunner, OsascriptRunner
+from backup_manager import BackupManager, BackupCallback
 import appdirs
 
 
@@ -16,21 +22,49 @@ class DB(ABC):
 
     DATA_DICT = appdirs.user_config_dir("MapleVocabUtility")
     BACKUP_SUBDICT = "backup/"
+    backups = BackupManager()
+
+    FETCH_PAGE_SIZE = 200  # entries per page yielded by fetch_all()
+
+    # Commits requested by DataManager are coalesced for up to COMMIT_DELAY_MS, or until COMMIT_BATCH_SIZE changes are
+    # pending. 0 to commit on every request, for data sources that are cheap to commit.
+    COMMIT_DELAY_MS = 0
+    COMMIT_BATCH_SIZE = 1
+
+    def open(self) -> None:
+        """
+        Prepare the data base to be read, if it's expensive (e.g. copying it). Called on the loader thread before
+        estimate_count() and fetch_all(), which also call it if needed. Calling it again is a no-op.
+        Can throw RuntimeError.
+        :return: None
+        """
+        pass
 
     @abstractmethod
-    def fetch_all(self, new_only: bool) -> [dict]:
+    def fetch_all(self, new_only: bool) -> Iterator[List[dict]]:
         """
-        Fetch all entries in the data base. Each item in the return is a dict with the following keys:
+        Fetch all entries in the data base, page by page. Each page is a list of at most FETCH_PAGE_SIZE dicts with
+        the following keys:
         - "word_id" -> str
         - "subject" -> str
         - "usage" -> str
         - "source" -> str
+        This is a generator, so entries are only read from the data base as pages are consumed.
         Can throw RuntimeError.
         :param new_only: Only fetch new entries
-        :return: The list of entries in the database
+        :return: An iterator over pages of entries in the database
         """
         pass
 
+    def estimate_count(self, new_only: bool) -> int:
+        """
+        Estimate the number of entries fetch_all() is going to return, for progress report only.
+        Can throw RuntimeError.
+        :param new_only: Only count new entries
+        :return: The estimated number of entries, or 0 if unknown
+        """
+        return 0
+
     @abstractmethod
     def set_word_mature_without_commit(self, word_id: str, category: int) -> None:
         """
@@ -42,6 +76,17 @@ class DB(ABC):
         """
         pass
 
+    def set_words_mature_without_commit(self, word_ids: List[str], category: int) -> None:
+        """
+        Set entries as new/learned in bulk. See set_word_mature_without_commit().
+        Can throw RuntimeError.
+        :param word_ids: IDs from fetch_all()
+        :param category: 0 for new, 100 for learned
+        :return: None
+        """
+        for word_id in word_ids:
+            self.set_word_mature_without_commit(word_id, category)
+
     @abstractmethod
     def commit_changes(self) -> None:
         """
@@ -52,193 +97,355 @@ class DB(ABC):
         pass
 
     @staticmethod
-    def backup_file(file: str, suffix: str = "") -> None:
+    def backup_file(file: str, suffix: str = "", done: Optional[BackupCallback] = None) -> None:
         """
-        Make a copy of the file as backup at current directory
+        Back up the file into the backup directory in background, unless it is unchanged since the last backup.
         :param file:
-        :param suffix:
+        :param suffix: Suffix of the archive name. Archives of the same suffix are compared and pruned together.
+        :param done: Callback on completion or failure, called on the backup thread
         :return:
         """
-
-        os.makedirs(os.path.join(DB.DATA_DICT, DB.BACKUP_SUBDICT), exist_ok=True)
-
-        backup_name = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
-        if suffix != "":
-            backup_name += "_" + suffix
-        backup_full_name = os.path.join(DB.DATA_DICT, DB.BACKUP_SUBDICT, backup_name)
-
-        subprocess.Popen(['bash', '-c',
-                          'cp "%s" "%s" && tar -czf "%s.tar.gz" "%s" && rm "%s"' %
-                          (file, backup_full_name, backup_full_name, backup_full_name, backup_full_name)],
-                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        DB.backups.backup(file, os.path.join(DB.DATA_DICT, DB.BACKUP_SUBDICT), suffix, done)
 
 
 class ThingsDB(DB):
+    """
+    Things 3 list as data source. Words are moved to Trash when set as learned, and moved back to the list when set as
+    new. Moves are queued and run as a single operation by commit_changes(), which DataManager coalesces. In immediate
+    mode, each move is run on its own right away instead.
+    """
+
+    COMMIT_DELAY_MS = 2000
+    COMMIT_BATCH_SIZE = 50
 
-    def __init__(self, things_list: str):
+    def __init__(self, things_list: str, immediate: bool = False, runner: Optional[ScriptRunner] = None):
         self.things_list = things_list
-        self.word_categories = {}
+        self.immediate = immediate
+        self.runner = runner if runner is not None else OsascriptRunner()
+        self.word_categories = {}  # word -> category in Things
+        self.pending_moves: Dict[str, int] = {}  # word -> category to move to at the next commit
 
-    def fetch_all(self, new_only: bool) -> [dict]:
+    def fetch_all(self, new_only: bool) -> Iterator[List[dict]]:
         records = []
-        script = """
-            set retList to {}
-            tell application "Things3"
-                repeat with toDo in to dos of project "%s"
-                    set end of retList to (name of toDo & "😅" & notes of toDo)
-                end repeat
-            end tell
-            set AppleScript's text item delimiters to "🥲"
-            set retString to retList as string
-            return retString
-        """ % self.things_list
-        p = subprocess.Popen(["osascript"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        out, err = p.communicate(script.encode())
-        if p.returncode != 0:
+        try:
+            todos = self.runner.fetch_todos(self.things_list)
+        except RuntimeError as e:
             raise RuntimeError(f"Failed to run applescript to fetch word list.\n"
                                f"Please make sure Things 3 is installed and the list is configured properly.\n\n"
-                               f"{err.decode('utf-8')}")
-
-        for entry in out.decode("utf-8").split("🥲"):
-            entry = entry.strip()
-            if len(entry) == 0:
-                continue
-            p = entry.split("😅")
-            assert len(p) == 2, "Invalid applescript output entry"
-            pp = p[1].split("\n[Source] ")
+                               f"{e}")
+
+        for name, notes in todos:
+            pp = notes.split("\n[Source] ")
             records.append({
-                "word_id": p[0],  # using word as word_id
-                "subject": p[0],
+                "word_id": name,  # using word as word_id
+                "subject": name,
                 "usage": pp[0],
                 "source": pp[-1] if len(pp) >= 2 else "",
                 # no div of align right since they should be already there if transferred from Kindle
             })
-            self.word_categories[p[0]] = 0
+            self.word_categories[name] = 0
+            if len(records) >= self.FETCH_PAGE_SIZE:
+                yield records
+                records = []
 
-        return records
+        if len(records) > 0:
+            yield records
 
     def add_words_back(self, records: [dict]) -> None:
-        script = """
-            tell application "Things3"
-        """
+        todos = []
         for record in records:
             note = record["usage"]
             if record["source"] != "":
                 note += "\n[Source] " + record["source"]
-            script += """
-                make new to do with properties {name:"%s", notes:"%s"} at the end of project "%s"
-            """ % (record["subject"], note.replace('"', '\\"'), self.things_list)
-        script += """
-            end tell
-        """
-        p = subprocess.Popen(["osascript"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        out, err = p.communicate(script.encode())
-        if p.returncode != 0:
+            todos.append((record["subject"], note))
+        try:
+            self.runner.add_todos(self.things_list, todos)
+        except RuntimeError as e:
             raise RuntimeError(f"Failed to run applescript to add words.\n"
                                f"Please make sure Things 3 is installed and the list is configured properly.\n\n"
-                               f"{err.decode('utf-8')}")
+                               f"{e}")
 
     def set_word_mature_without_commit(self, word_id: str, category: int) -> None:
 
-        if self.word_categories[word_id] == category:
+        if self.immediate:
+            if self.word_categories[word_id] != category:
+                # Move to-do immediately instead of waiting for commit_changes(), but in async way
+                self.runner.move_todos(self.things_list, {word_id: category == 100}, wait=False)
+                self.word_categories[word_id] = category
             return
 
-        if category == 100:
-            script = f"""
-                tell application "Things3"
-                    set proj to project "{self.things_list}"
-                    set toDo to to do named "{word_id}" of proj
-                    delete toDo
-                end tell
-            """
+        if self.word_categories[word_id] == category:
+            self.pending_moves.pop(word_id, None)  # moved back before committed
         else:
-            script = f"""
-                tell application "Things3"
-                    set toDo to to do named "{word_id}" of list "Trash"
-                    set project of toDo to project "{self.things_list}"
-                end tell
-            """
+            self.pending_moves[word_id] = category
 
-        # Move to-do immediately instead of waiting for commit_changes(), but in async way
-        p = subprocess.Popen(["osascript"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        p.stdin.write(script.encode())
-        p.stdin.close()
+    def commit_changes(self) -> None:
+        if len(self.pending_moves) == 0:
+            return
+        try:
+            self.runner.move_todos(self.things_list,
+                                   {word_id: category == 100 for word_id, category in self.pending_moves.items()})
+        except RuntimeError as e:
+            raise RuntimeError(f"Failed to run applescript to move words.\n"
+                               f"Please make sure Things 3 is installed and the list is configured properly.\n\n"
+                               f"{e}")
+        self.word_categories.update(self.pending_moves)
+        self.pending_moves.clear()
 
-        self.word_categories[word_id] = category
 
-    def commit_changes(self) -> None:
-        pass
+class _OffsetLines:
+    """Lines of a binary file decoded as str, tracking the byte offset right after the last line read."""
+
+    def __init__(self, f, offset: int):
+        self.f = f
+        self.end = offset
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self.f:
+            self.end += len(line)
+            yield line.decode("utf-8")
 
 
 class CsvDB(DB):
     """
-    CSV data source. The csv should have 5 columns: subject, usage, title, authors, category. The first line of the
-    file is regarded as heading and gets discarded.
+    CSV data source. The csv should have 5 columns: subject, usage, title, authors, category. The first row of the
+    file is regarded as heading and gets discarded. Fields may be quoted, and quoted fields may contain the delimiter
+    and newlines.
+    Rows are not kept in memory. fetch_all() indexes the byte offset of each row, so that a commit copies unchanged
+    bytes and only re-encodes changed rows. Committing still rewrites the file, so commits are coalesced by DataManager.
     """
 
-    def __init__(self, db_file):
-        self.db_file = db_file
-        self.csv_first_line = None
-        self.csv_data = []
+    COMMIT_DELAY_MS = 2000
+    COMMIT_BATCH_SIZE = 100
 
-    def fetch_all(self, new_only: bool) -> [dict]:
+    COPY_CHUNK_SIZE = 1024 * 1024
 
-        DB.backup_file(self.db_file, suffix=os.path.basename(self.db_file))
-
-        # Fetch data from DB, preserving all data.
-        # self.csv_data = list of [subject, usage, title, authors, category, ...]
-        with open(self.db_file, "r", encoding="utf-8") as file:
-            self.csv_first_line = file.readline()
-            if len(self.csv_first_line.split(",")) < 5:
+    def __init__(self, db_file: str, delimiter: str = ",", backup_done: Optional[BackupCallback] = None):
+        self.db_file = db_file
+        self.delimiter = delimiter
+        self.backup_done = backup_done
+        # Row i spans [row_offsets[i], row_offsets[i + 1]) of the file. row_offsets[0] is the end of the heading.
+        self.row_offsets = array("q")
+        self.row_learned = bytearray()  # 1 if the category of the row in the file is 100
+        self.index_complete = False
+        self.dirty_rows: Dict[int, str] = {}  # row -> category to write at the next commit
+        # fetch_all() runs on the loader thread, while changes and commits come from the main thread
+        self._lock = threading.Lock()
+
+    def _index_rows(self, offsets: List[int], learned: List[bool]) -> None:
+        """Append rows read by fetch_all() to the index, unless commit_changes() has indexed the whole file already."""
+        with self._lock:
+            if not self.index_complete:
+                self.row_offsets.extend(offsets)
+                self.row_learned.extend(learned)
+
+    def fetch_all(self, new_only: bool) -> Iterator[List[dict]]:
+
+        DB.backup_file(self.db_file, suffix=os.path.basename(self.db_file), done=self.backup_done)
+
+        with self._lock:
+            self.row_offsets = array("q")
+            self.row_learned = bytearray()
+            self.index_complete = False
+            self.dirty_rows = {}
+
+        with open(self.db_file, "rb") as file:
+            lines = _OffsetLines(file, 0)
+            rows = csv.reader(lines, delimiter=self.delimiter)
+
+            # Discard the heading
+            heading = next(rows, [])
+            if len(heading) < 5:
                 raise RuntimeError("CSV file column number incorrect. At least 5 columns are required "
                                    "([subject, usage, title, authors, category], while the content can be empty.)")
-            # Discard the first line
-            for line in file:
-                self.csv_data.append(line.split(","))
-
-        # Process entries from DB
-        records = []
-        for i in range(len(self.csv_data)):
-            entry = self.csv_data[i]
-            if not new_only or entry[4] != "100":
-                source = ""
-                if entry[2] != "":
-                    source += '<div align="right" style="font-size:12px"><I>%s</I>' % entry[2]
-                    if entry[3] != "":
-                        source += ', %s' % entry[3]
-                    source += "</div>"
-                records.append({
-                    "word_id": str(i),  # use line number as word_id
-                    "subject": entry[0],
-                    "usage": entry[1],
-                    "source": source,
-                })
-
-        return records
+            with self._lock:
+                self.row_offsets.append(lines.end)
+
+            # Process entries from DB. Rows are indexed page by page.
+            records = []
+            offsets, learned = [], []
+            i = 0
+            for entry in rows:
+                offsets.append(lines.end)
+                if len(entry) < 5:
+                    if len(entry) == 0:  # empty line
+                        learned.append(False)
+                        i += 1
+                        continue
+                    entry += [""] * (5 - len(entry))
+                category = entry[4]
+                learned.append(category == "100")
+                if not new_only or category != "100":
+                    source = ""
+                    if entry[2] != "":
+                        source += '<div align="right" style="font-size:12px"><I>%s</I>' % entry[2]
+                        if entry[3] != "":
+                            source += ', %s' % entry[3]
+                        source += "</div>"
+                    records.append({
+                        "word_id": str(i),  # use row number as word_id
+                        "subject": entry[0],
+                        "usage": entry[1],
+                        "source": source,
+                    })
+                    if len(records) >= self.FETCH_PAGE_SIZE:
+                        self._index_rows(offsets, learned)  # before the rows can be changed
+                        offsets, learned = [], []
+                        yield records
+                        records = []
+                elif len(offsets) >= self.FETCH_PAGE_SIZE:
+                    self._index_rows(offsets, learned)
+                    offsets, learned = [], []
+                i += 1
+
+            self._index_rows(offsets, learned)
+            with self._lock:
+                self.index_complete = True
+
+        if len(records) > 0:
+            yield records
+
+    def estimate_count(self, new_only: bool) -> int:
+        with open(self.db_file, "rb") as file:
+            return max(sum(1 for _ in file) - 1, 0)  # excluding the heading, and counting embedded newlines
 
     def set_word_mature_without_commit(self, word_id: str, category: int) -> None:
-        self.csv_data[int(word_id)][4] = str(category)
+        row = int(word_id)
+        with self._lock:
+            if self.row_learned[row] == (category == 100):
+                self.dirty_rows.pop(row, None)  # same as the file
+            else:
+                self.dirty_rows[row] = str(category)
 
     def commit_changes(self):
-        with open(self.db_file, "w", encoding="utf-8") as file:
-            file.writelines(self.csv_first_line)
-            for entry in self.csv_data:
-                file.writelines(",".join(entry))
+        with self._lock:
+            if len(self.dirty_rows) == 0:
+                return
+
+            # Changed rows are located through the index, which needs to cover the whole file if still loading. The
+            # loader keeps reading the replaced file, in which rows not loaded yet are unchanged.
+            if not self.index_complete:
+                with open(self.db_file, "rb") as src:
+                    src.seek(self.row_offsets[-1])
+                    lines = _OffsetLines(src, self.row_offsets[-1])
+                    for entry in csv.reader(lines, delimiter=self.delimiter):
+                        self.row_offsets.append(lines.end)
+                        self.row_learned.append(len(entry) > 4 and entry[4] == "100")
+                self.index_complete = True
+
+            # Write to a temporary file and replace, so that the file is never left half written
+            temp_file = self.db_file + ".tmp"
+            shifts = []  # (row, change of length of the row)
+            with open(self.db_file, "rb") as src, open(temp_file, "wb") as dst:
+                pos = 0
+                for row in sorted(self.dirty_rows.keys()):
+                    start, end = self.row_offsets[row], self.row_offsets[row + 1]
+                    self._copy_bytes(src, dst, start - pos)
+                    raw = src.read(end - start).decode("utf-8")
+                    pos = end
+
+                    entry = next(csv.reader(io.StringIO(raw, newline=""), delimiter=self.delimiter))
+                    entry += [""] * (5 - len(entry))
+                    entry[4] = self.dirty_rows[row]
+                    out = io.StringIO()
+                    line_end = raw[len(raw.rstrip("\r\n")):]  # keep the line ending of the row
+                    csv.writer(out, delimiter=self.delimiter, lineterminator=line_end).writerow(entry)
+                    encoded = out.getvalue().encode("utf-8")
+                    dst.write(encoded)
+                    shifts.append((row, len(encoded) - (end - start)))
+                self._copy_bytes(src, dst, -1)
+            os.replace(temp_file, self.db_file)
+
+            # Shift offsets of the rows after each changed row
+            shift = 0
+            for i, (row, delta) in enumerate(shifts):
+                shift += delta
+                stop = shifts[i + 1][0] + 1 if i + 1 < len(shifts) else len(self.row_offsets)
+                for j in range(row + 1, stop):
+                    self.row_offsets[j] += shift
+                self.row_learned[row] = self.dirty_rows[row] == "100"
+            self.dirty_rows.clear()
+
+    def _copy_bytes(self, src, dst, size: int) -> None:
+        """Copy size bytes from src to dst, or till the end of src if size is -1."""
+        while size != 0:
+            chunk = src.read(self.COPY_CHUNK_SIZE if size == -1 else min(size, self.COPY_CHUNK_SIZE))
+            if not chunk:
+                break
+            dst.write(chunk)
+            if size != -1:
+                size -= len(chunk)
 
 
 class KindleDB(DB):
     """
     Kindle vocabulary builder database. Using SQLite3 format.
+    In snapshot mode, the database is copied to local disk by open(), and all queries and category updates go to the
+    copy.
+    Changed categories are synced back to the device in a single transaction by commit_changes() or sync(), which
+    DataManager coalesces, so that the mounted volume is rarely touched.
+    A word looked up several times is fetched as one entry per lookup (LOOKUPS_ALL), or as one entry with the latest
+    usage (LOOKUPS_LATEST) or with all usages, the latest first (LOOKUPS_MERGED).
     """
 
-    def __init__(self, db_file: str):
-        self.db_file = db_file
-        self.conn = sqlite3.connect(self.db_file)
-        DB.backup_file(self.db_file, "kindle")
+    SNAPSHOT_FILENAME = "kindle_snapshot.db"
+
+    LOOKUPS_ALL = "all"
+    LOOKUPS_LATEST = "latest"
+    LOOKUPS_MERGED = "merged"
 
-    def fetch_all(self, new_only: bool) -> [dict]:
-        # Fetch data from DB. Generate list of [id, word, usage, title, authors, category]
-        entries = self.conn.execute(
+    def __init__(self, db_file: str, backup_done: Optional[BackupCallback] = None, snapshot_file: Optional[str] = None,
+                 lookups: str = LOOKUPS_ALL):
+        """
+        :param db_file: vocab.db on the device
+        :param backup_done: Callback of the backup of db_file
+        :param snapshot_file: Local file to copy the database to, or None to work on db_file directly
+        :param lookups: LOOKUPS_ALL, LOOKUPS_LATEST or LOOKUPS_MERGED
+        """
+        self.db_file = db_file
+        self.snapshot_file = snapshot_file
+        self.lookups = lookups
+        self.unsynced: Dict[str, int] = {}  # word id -> category changed in the snapshot but not on the device yet
+        DB.backup_file(self.db_file, "kindle", done=backup_done)
+        # fetch_all() may run on a loader thread, while category updates are issued from the main thread
+        if snapshot_file is None:
+            self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._opened = True
+        else:
+            self.conn = sqlite3.connect(snapshot_file, check_same_thread=False)
+            self._opened = False  # the copy is taken by open(), on the loader thread
+            self._open_lock = threading.Lock()
+            self.COMMIT_DELAY_MS = 2000
+            self.COMMIT_BATCH_SIZE = 100
+
+    def open(self) -> None:
+        """Copy the database to the snapshot, in snapshot mode."""
+        if self._opened:
+            return
+        with self._open_lock:
+            if self._opened:
+                return
+            try:
+                device = sqlite3.connect(self.db_file)
+                try:
+                    device.backup(self.conn)  # online backup API, consistent even if the device is being written
+                finally:
+                    device.close()
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                # Helper indexes for new_only and lookups of a word by time, only on the copy to leave the device
+                # untouched
+                self.conn.execute("CREATE INDEX IF NOT EXISTS maple_words_category ON WORDS (category)")
+                self.conn.execute("CREATE INDEX IF NOT EXISTS maple_lookups_word_time ON LOOKUPS (word_key, timestamp)")
+                self.conn.commit()
+            except sqlite3.Error as e:
+                raise RuntimeError(f"Failed to copy Kindle DB.\n\n{e}")
+            self._opened = True
+
+    def fetch_all(self, new_only: bool) -> Iterator[List[dict]]:
+        self.open()
+        # Fetch data from DB. Generate list of [id, word, usage, title, authors, category], lookups of a word together
+        # and the latest first
+        cursor = self.conn.execute(
             """
             SELECT
               WORDS.id,
@@ -251,34 +458,122 @@ class KindleDB(DB):
               LEFT JOIN LOOKUPS ON WORDS.id = LOOKUPS.word_key
               LEFT JOIN BOOK_INFO ON LOOKUPS.book_key = BOOK_INFO.id
             {}
-            """.format("WHERE WORDS.category = 0" if new_only else "")
-        ).fetchall()
+            {}
+            """.format("WHERE WORDS.category = 0" if new_only else "",
+                       "" if self.lookups == self.LOOKUPS_ALL else "ORDER BY WORDS.rowid, LOOKUPS.timestamp DESC")
+        )
+        rows = self._fetch_rows(cursor)
+
+        if self.lookups == self.LOOKUPS_ALL:
+            entries = ((word_id, word, usage, self._make_source(title, authors))
+                       for (word_id, word, usage, title, authors, category) in rows)
+        else:
+            entries = (self._aggregate_lookups(list(lookups)) for _, lookups in groupby(rows, key=lambda row: row[0]))
 
-        # Process entries from DB.
         records = []
-        for (word_id, word, usage, title, authors, category) in entries:
+        for (word_id, word, usage, source) in entries:
             records.append({
                 "word_id": word_id,  # use kindle db id as word_id
                 "subject": word,
                 "usage": usage,
-                "source": '<div align="right" style="font-size:12px"><I>%s</I>, %s</div>' % (title, authors),
+                "source": source,
             })
+            if len(records) >= self.FETCH_PAGE_SIZE:
+                yield records
+                records = []
+
+        if len(records) > 0:
+            yield records
+
+    def _fetch_rows(self, cursor: sqlite3.Cursor) -> Iterator[tuple]:
+        # Fetch rows page by page, so that only one page of rows is held at a time
+        try:
+            while True:
+                entries = cursor.fetchmany(self.FETCH_PAGE_SIZE)
+                if len(entries) == 0:
+                    break
+                yield from entries
+        finally:
+            cursor.close()
 
-        return records
+    @staticmethod
+    def _make_source(title: str, authors: str) -> str:
+        return '<div align="right" style="font-size:12px"><I>%s</I>, %s</div>' % (title, authors)
+
+    def _aggregate_lookups(self, lookups: List[tuple]) -> Tuple[str, str, str, str]:
+        """Make (word_id, word, usage, source) of a word from its lookups, the latest first."""
+        (word_id, word, usage, title, authors, category) = lookups[0]
+        if self.lookups == self.LOOKUPS_MERGED:
+            usages = []
+            for lookup in lookups:
+                if lookup[2] is not None and lookup[2] not in usages:
+                    usages.append(lookup[2])
+            usage = "<br>".join(usages)
+        return word_id, word, usage if usage is not None else "", self._make_source(title, authors)
+
+    def estimate_count(self, new_only: bool) -> int:
+        self.open()
+        (count,) = self.conn.execute(
+            """
+            SELECT COUNT(*)
+            FROM WORDS
+            {}
+            {}
+            """.format("LEFT JOIN LOOKUPS ON WORDS.id = LOOKUPS.word_key" if self.lookups == self.LOOKUPS_ALL else "",
+                       "WHERE WORDS.category = 0" if new_only else "")
+        ).fetchone()
+        return count
 
     def set_word_mature_without_commit(self, word_id: str, category: int) -> None:
+        self.open()
         self.conn.execute(
             """
             UPDATE words SET category = ? WHERE id = ?
             """, (category, str(word_id))
         )
+        if self.snapshot_file is not None:
+            self.unsynced[str(word_id)] = category
+
+    def set_words_mature_without_commit(self, word_ids: List[str], category: int) -> None:
+        self.open()
+        self.conn.executemany(
+            """
+            UPDATE words SET category = ? WHERE id = ?
+            """, [(category, str(word_id)) for word_id in word_ids]
+        )
+        if self.snapshot_file is not None:
+            for word_id in word_ids:
+                self.unsynced[str(word_id)] = category
 
     def commit_changes(self) -> None:
         self.conn.commit()
+        self.sync()
+
+    def sync(self) -> None:
+        """
+        Write categories changed in the snapshot back to the device in a single transaction. No-op if not in snapshot
+        mode. Can throw RuntimeError.
+        """
+        if len(self.unsynced) == 0:
+            return
+        try:
+            device = sqlite3.connect(self.db_file)
+            try:
+                with device:  # one transaction
+                    device.executemany("UPDATE words SET category = ? WHERE id = ?",
+                                       [(category, word_id) for word_id, category in self.unsynced.items()])
+            finally:
+                device.close()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to write changes back to Kindle. Please make sure Kindle is connected.\n\n{e}")
+        self.unsynced.clear()
 
     def __del__(self):
         self.conn.close()
 
 
-def eject_kindle_volume():
+def eject_kindle_volume(db: Optional[KindleDB] = None):
+    """Unmount Kindle, after syncing changes of the db in snapshot mode. Can throw RuntimeError."""
+    if db is not None:
+        db.commit_changes()
     os.system("hdiutil unmount /Volumes/Kindle")
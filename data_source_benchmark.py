@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+# Benchmarks of the CSV word list:
+# - committing status changes, one commit per change against coalesced commits
+# - loading, splitting lines held in memory (before) against the streaming reader with a row index
+# - moving Things to-dos against a fake Things with osascript-like latency, one operation per word against batches
+# - updating categories of a synthetic Kindle vocab.db, one UPDATE per word against executemany
+# - loading a synthetic Kindle vocab.db, one entry per lookup against lookups aggregated per word
+# Run: QT_QPA_PLATFORM=offscreen python data_source_benchmark.py
+
+import os
+import sys
+import time
+import resource
+import sqlite3
+import subprocess
+import tempfile
+from PyQt6 import QtCore
+from data_source import DB, CsvDB, ThingsDB, KindleDB
+from script_runner import FakeThingsRunner
+from data_manager import DataManager, Record, RecordStatus
+
+ROWS = 20000
+CHANGES = 500
+LOAD_ROWS = 100000
+THINGS_WORDS = 300
+THINGS_LATENCY = 0.02  # per osascript process
+THINGS_ITEM_LATENCY = 0.001  # per to-do touched
+KINDLE_WORDS = 50000
+
+
+def make_csv(csv_file: str, rows: int) -> None:
+    with open(csv_file, "w", encoding="utf-8") as f:
+        f.write("Word,Usage,Title,Author,Category,Unit\n")
+        for i in range(rows):
+            f.write("word%d,This is the usage of word%d in a sentence.,Some Book,Some Author,0,\n" % (i, i))
+
+
+def load_split(csv_file: str) -> None:
+    """Loading before the streaming reader: all lines split and held, as CsvDB.csv_data."""
+    with open(csv_file, "r", encoding="utf-8") as file:
+        file.readline()
+        csv_data = [line.split(",") for line in file]
+    records = []
+    for i in range(len(csv_data)):
+        entry = csv_data[i]
+        if entry[4] != "100":
+            source = ""
+            if entry[2] != "":
+                source += '<div align="right" style="font-size:12px"><I>%s</I>' % entry[2]
+                if entry[3] != "":
+                    source += ', %s' % entry[3]
+                source += "</div>"
+            records.append({"word_id": str(i), "subject": entry[0], "usage": entry[1], "source": source})
+            if len(records) >= DB.FETCH_PAGE_SIZE:
+                records = []
+    load_split.csv_data = csv_data  # kept for the session
+
+
+def load_streaming(csv_file: str) -> None:
+    db = CsvDB(csv_file)
+    for _ in db.fetch_all(new_only=True):
+        pass
+    load_streaming.db = db  # kept for the session
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # peak RSS in bytes on macOS
+
+
+def run_load(csv_file: str, method: str) -> None:
+    """Run in a fresh process, so that the RSS belongs to the method alone."""
+    base = rss_bytes()
+    start = time.perf_counter()
+    {"split": load_split, "streaming": load_streaming}[method](csv_file)
+    elapsed = time.perf_counter() - start
+    print("%12s %10.3f s %10.1f MiB RSS growth" % (method, elapsed, (rss_bytes() - base) / 1024 / 1024))
+
+
+def run_things(immediate: bool) -> (float, int):
+    runner = FakeThingsRunner({"Words": [("word%d" % i, "") for i in range(THINGS_WORDS)]},
+                              latency=THINGS_LATENCY, item_latency=THINGS_ITEM_LATENCY)
+    db = ThingsDB("Words", immediate=immediate, runner=runner)
+    for _ in db.fetch_all(new_only=True):
+        pass
+    runner.calls.clear()
+
+    start = time.perf_counter()
+    for i in range(THINGS_WORDS):
+        db.set_word_mature_without_commit("word%d" % i, 100)
+        if (i + 1) % ThingsDB.COMMIT_BATCH_SIZE == 0:
+            db.commit_changes()  # as coalesced by DataManager
+    db.commit_changes()
+    runner.join()
+    elapsed = time.perf_counter() - start
+    assert len(runner.trash) == THINGS_WORDS
+    return elapsed, len(runner.calls)
+
+
+def make_kindle_db(db_file: str, words: int, lookups_per_word: int = 1) -> None:
+    """Make a vocab.db of the given number of words in the schema of the test database."""
+    template = sqlite3.connect(os.path.join(os.path.dirname(os.path.abspath(__file__)), "resource", "test_vocab.db"))
+    schema = [sql for (sql,) in template.execute("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL")]
+    template.close()
+    conn = sqlite3.connect(db_file)
+    for sql in schema:
+        conn.execute(sql)
+    conn.execute("INSERT INTO BOOK_INFO (id, title, authors) VALUES ('book', 'Some Book', 'Some Author')")
+    conn.executemany("INSERT INTO WORDS (id, word, stem, lang, category) VALUES (?, ?, ?, 'en', 0)",
+                     [("en:word%d" % i, "word%d" % i, "word%d" % i) for i in range(words)])
+    conn.executemany("INSERT INTO LOOKUPS (id, word_key, book_key, usage, timestamp) VALUES (?, ?, 'book', ?, ?)",
+                     [("lookup%d-%d" % (i, j), "en:word%d" % i, "Usage %d of word%d." % (j, i), j * words + i)
+                      for j in range(lookups_per_word) for i in range(words)])
+    conn.commit()
+    conn.close()
+
+
+def run_kindle(db_file: str, batch: bool) -> float:
+    db = KindleDB(db_file)
+    word_ids = [r["word_id"] for page in db.fetch_all(new_only=True) for r in page]
+    start = time.perf_counter()
+    if batch:
+        db.set_words_mature_without_commit(word_ids, 100)
+    else:
+        for word_id in word_ids:
+            db.set_word_mature_without_commit(word_id, 100)
+    db.commit_changes()
+    elapsed = time.perf_counter() - start
+    DB.backups.wait()
+    return elapsed
+
+
+def run_kindle_load(db_file: str, lookups: str) -> (float, int):
+    snapshot_file = db_file + ".snapshot"
+    for file in [snapshot_file, snapshot_file + "-wal", snapshot_file + "-shm"]:
+        if os.path.exists(file):
+            os.remove(file)
+    db = KindleDB(db_file, snapshot_file=snapshot_file, lookups=lookups)
+    db.open()  # copy to the snapshot, not timed
+    start = time.perf_counter()
+    count = sum(len(page) for page in db.fetch_all(new_only=True))
+    elapsed = time.perf_counter() - start
+    DB.backups.wait()
+    return elapsed, count
+
+
+def run(csv_file: str, coalesce: bool) -> (float, int):
+    data = DataManager("", "")
+    db = CsvDB(csv_file)
+    if not coalesce:
+        db.COMMIT_DELAY_MS = 0  # commit on every change, as before
+    data._db = db
+    for page in db.fetch_all(new_only=False):
+        for raw in page:
+            data._records.append(Record(cid=len(data._records), subject=raw["subject"], db_id=raw["word_id"]))
+            data._counts[RecordStatus.UNVIEWED] += 1
+
+    commits = 0
+    commit_changes = db.commit_changes
+
+    def counting_commit_changes():
+        nonlocal commits
+        commits += 1 if len(db.dirty_rows) > 0 else 0
+        commit_changes()
+
+    db.commit_changes = counting_commit_changes
+
+    start = time.perf_counter()
+    for cid in range(CHANGES):
+        data.set_status(cid, RecordStatus.DISCARDED)
+    data.flush_changes()  # what the timer or closing the window does eventually
+    elapsed = time.perf_counter() - start
+    return elapsed, commits
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == "--load":
+        DB.DATA_DICT = os.path.dirname(sys.argv[2])
+        run_load(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    app = QtCore.QCoreApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as d:
+        DB.DATA_DICT = d  # keep backups out of the user config directory
+        csv_file = os.path.join(d, "words.csv")
+        print("%d rows, %d status changes" % (ROWS, CHANGES))
+        for coalesce in [False, True]:
+            make_csv(csv_file, ROWS)
+            elapsed, commits = run(csv_file, coalesce)
+            print("%12s %10.1f changes/s %6d file writes" % ("coalesced" if coalesce else "every change",
+                                                           CHANGES / elapsed, commits))
+
+        make_csv(csv_file, LOAD_ROWS)
+        print("%d rows, %.1f MiB, loading" % (LOAD_ROWS, os.path.getsize(csv_file) / 1024 / 1024))
+        for method in ["split", "streaming"]:
+            subprocess.run([sys.executable, __file__, "--load", csv_file, method])
+
+        print("%d Things to-dos moved to Trash" % THINGS_WORDS)
+        for immediate in [True, False]:
+            elapsed, calls = run_things(immediate)
+            print("%12s %10.3f s %6d scripts" % ("immediate" if immediate else "batched", elapsed, calls))
+
+        print("%d Kindle words set as learned" % KINDLE_WORDS)
+        kindle_file = os.path.join(d, "vocab.db")
+        for batch in [False, True]:
+            if os.path.exists(kindle_file):
+                os.remove(kindle_file)
+            make_kindle_db(kindle_file, KINDLE_WORDS)
+            print("%12s %10.3f s" % ("executemany" if batch else "per word", run_kindle(kindle_file, batch)))
+
+        print("%d Kindle words looked up 3 times each, loading" % KINDLE_WORDS)
+        os.remove(kindle_file)
+        make_kindle_db(kindle_file, KINDLE_WORDS, lookups_per_word=3)
+        for lookups in [KindleDB.LOOKUPS_ALL, KindleDB.LOOKUPS_LATEST, KindleDB.LOOKUPS_MERGED]:
+            elapsed, count = run_kindle_load(kindle_file, lookups)
+            print("%12s %10.3f s %8d entries" % (lookups, elapsed, count))
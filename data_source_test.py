@@ -0,0 +1,241 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import TestCase
+from data_source import *
+from script_runner import FakeThingsRunner
+
+
+class CsvDBTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.data_dict = DB.DATA_DICT
+        DB.DATA_DICT = self.dir.name  # keep backups out of the user config directory
+        self.csv_file = os.path.join(self.dir.name, "words.csv")
+        with open(self.csv_file, "w", encoding="utf-8") as f:
+            f.write("Word,Usage,Title,Author,Category,Unit\n")
+            f.write("a,usage of a,Book,Author,0,\n")
+            f.write("b,usage of b,Book,Author,100,\n")
+            f.write("c,usage of c,,,0,\n")
+        self.db = CsvDB(self.csv_file)
+
+    def tearDown(self):
+        DB.backups.wait()
+        DB.DATA_DICT = self.data_dict
+        self.dir.cleanup()
+
+    def read_categories(self) -> [str]:
+        with open(self.csv_file, "r", encoding="utf-8") as f:
+            return [line.split(",")[4] for line in f.read().splitlines()[1:]]
+
+    def test_commit_dirty_rows(self):
+        pages = list(self.db.fetch_all(new_only=True))
+        self.assertEqual(["a", "c"], [r["subject"] for r in pages[0]])
+
+        self.db.set_word_mature_without_commit("0", 100)
+        self.db.set_word_mature_without_commit("1", 100)  # unchanged
+        self.assertEqual({0: "100"}, self.db.dirty_rows)
+        self.db.commit_changes()
+        self.assertEqual(["100", "100", "0"], self.read_categories())
+        self.assertEqual({}, self.db.dirty_rows)
+        self.assertFalse(os.path.exists(self.csv_file + ".tmp"))
+
+    def test_skip_clean_commit(self):
+        list(self.db.fetch_all(new_only=False))
+        mtime = os.stat(self.csv_file).st_mtime_ns
+        self.db.set_word_mature_without_commit("2", 0)  # unchanged
+        self.db.commit_changes()
+        self.assertEqual(mtime, os.stat(self.csv_file).st_mtime_ns)
+
+    def write_csv(self, content: str, delimiter: str = ",") -> None:
+        with open(self.csv_file, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        self.db = CsvDB(self.csv_file, delimiter=delimiter)
+
+    def test_quoted_fields(self):
+        self.write_csv('Word,Usage,Title,Author,Category\r\n'
+                       'a,"one, two",Book,Author,0\r\n'
+                       'b,"say ""hi""\nand go",,,100\r\n'
+                       'c,"x",,,0')  # no line ending
+        records = [r for page in self.db.fetch_all(new_only=False) for r in page]
+        self.assertEqual(["one, two", 'say "hi"\nand go', "x"], [r["usage"] for r in records])
+        self.assertEqual(["0", "1", "2"], [r["word_id"] for r in records])
+
+        self.db.set_word_mature_without_commit("1", 0)
+        self.db.set_word_mature_without_commit("2", 100)
+        self.db.commit_changes()
+        with open(self.csv_file, "r", encoding="utf-8", newline="") as f:
+            self.assertEqual('Word,Usage,Title,Author,Category\r\n'
+                             'a,"one, two",Book,Author,0\r\n'  # unchanged rows are copied as-is
+                             'b,"say ""hi""\nand go",,,0\r\n'
+                             'c,x,,,100', f.read())
+
+        # The index follows the shifted rows
+        self.db.set_word_mature_without_commit("0", 100)
+        self.db.set_word_mature_without_commit("2", 0)
+        self.db.commit_changes()
+        records = [r for page in CsvDB(self.csv_file).fetch_all(new_only=True) for r in page]
+        self.assertEqual(["b", "c"], [r["subject"] for r in records])
+
+    def test_delimiter(self):
+        self.write_csv("Word;Usage;Title;Author;Category\nein;eins, zwei;;;0\n", delimiter=";")
+        records = [r for page in self.db.fetch_all(new_only=False) for r in page]
+        self.assertEqual("eins, zwei", records[0]["usage"])
+        self.db.set_word_mature_without_commit("0", 100)
+        self.db.commit_changes()
+        with open(self.csv_file, "r", encoding="utf-8") as f:
+            self.assertEqual("Word;Usage;Title;Author;Category\nein;eins, zwei;;;100\n", f.read())
+
+    def test_commit_while_loading(self):
+        self.write_csv("Word,Usage,Title,Author,Category\n" + "".join("w%d,,,,0\n" % i for i in range(5)))
+        self.db.FETCH_PAGE_SIZE = 2
+        pages = self.db.fetch_all(new_only=False)
+        first = next(pages)
+        self.db.set_word_mature_without_commit(first[0]["word_id"], 100)
+        self.db.commit_changes()  # indexes the rest of the file
+        self.assertTrue(self.db.index_complete)
+        rest = [r["subject"] for page in pages for r in page]
+        self.assertEqual(["w2", "w3", "w4"], rest)
+        self.assertEqual(["100", "0", "0", "0", "0"], self.read_categories())
+        self.assertEqual(6, len(self.db.row_offsets))
+
+
+class ThingsDBTest(TestCase):
+    def setUp(self):
+        self.runner = FakeThingsRunner({"Words": [("a", "usage of a\n[Source] Book"), ("b", "usage of b")]})
+        self.db = self.make_db()
+
+    def make_db(self, immediate: bool = False) -> ThingsDB:
+        db = ThingsDB("Words", immediate=immediate, runner=self.runner)
+        records = [r for page in db.fetch_all(new_only=True) for r in page]
+        self.assertEqual(["a", "b"], [r["subject"] for r in records])
+        self.assertEqual("Book", records[0]["source"])
+        self.runner.calls.clear()
+        return db
+
+    def names(self, todos: [(str, str)]) -> [str]:
+        return [name for name, _ in todos]
+
+    def test_batched_moves(self):
+        self.db.set_word_mature_without_commit("a", 100)
+        self.db.set_word_mature_without_commit("b", 100)
+        self.db.set_word_mature_without_commit("b", 0)  # moved back before committed
+        self.assertEqual([], self.runner.calls)
+        self.db.commit_changes()
+        self.assertEqual(["move_todos"], self.runner.calls)
+        self.assertEqual(["b"], self.names(self.runner.projects["Words"]))
+        self.assertEqual(["a"], self.names(self.runner.trash))
+
+        self.db.commit_changes()  # nothing pending
+        self.db.set_word_mature_without_commit("a", 0)
+        self.db.commit_changes()
+        self.assertEqual(["move_todos", "move_todos"], self.runner.calls)
+        self.assertEqual(["b", "a"], self.names(self.runner.projects["Words"]))
+
+    def test_immediate_moves(self):
+        self.db = self.make_db(immediate=True)
+        self.db.set_word_mature_without_commit("a", 100)
+        self.db.set_word_mature_without_commit("a", 100)  # already moved
+        self.db.set_word_mature_without_commit("b", 100)
+        self.runner.join()
+        self.assertEqual(["move_todos", "move_todos"], self.runner.calls)
+        self.assertEqual([], self.runner.projects["Words"])
+        self.db.commit_changes()
+        self.assertEqual(2, len(self.runner.calls))
+
+    def test_add_words_back(self):
+        self.db.add_words_back([{"subject": 'say "hi"', "usage": "usage", "source": "Book"}])
+        self.assertEqual(('say "hi"', "usage\n[Source] Book"), self.runner.projects["Words"][-1])
+
+    def test_failed_commit_kept_pending(self):
+        self.db.set_word_mature_without_commit("a", 100)
+        del self.runner.projects["Words"]
+        with self.assertRaises(RuntimeError):
+            self.db.commit_changes()
+        self.assertEqual({"a": 100}, self.db.pending_moves)
+
+
+class KindleDBTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.data_dict = DB.DATA_DICT
+        DB.DATA_DICT = self.dir.name  # keep backups out of the user config directory
+        self.db_file = os.path.join(self.dir.name, "vocab.db")
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "resource", "test_vocab.db"),
+                    self.db_file)
+
+    def tearDown(self):
+        DB.backups.wait()
+        DB.DATA_DICT = self.data_dict
+        self.dir.cleanup()
+
+    def device_category(self, word_id: str) -> int:
+        conn = sqlite3.connect(self.db_file)
+        (category,) = conn.execute("SELECT category FROM WORDS WHERE id = ?", (word_id,)).fetchone()
+        conn.close()
+        return category
+
+    def test_snapshot(self):
+        db = KindleDB(self.db_file, snapshot_file=os.path.join(self.dir.name, "snapshot.db"))
+        records = [r for page in db.fetch_all(new_only=True) for r in page]
+        word_id = records[0]["word_id"]
+        self.assertEqual(0, self.device_category(word_id))
+
+        db.set_word_mature_without_commit(word_id, 100)
+        db.conn.commit()
+        self.assertEqual(0, self.device_category(word_id))  # changed in the snapshot only
+        self.assertNotIn(word_id, [r["word_id"] for page in db.fetch_all(new_only=True) for r in page])
+
+        db.commit_changes()
+        self.assertEqual(100, self.device_category(word_id))
+        self.assertEqual({}, db.unsynced)
+
+    def test_snapshot_taken_by_open(self):
+        db = KindleDB(self.db_file, snapshot_file=os.path.join(self.dir.name, "snapshot.db"))
+        tables = "SELECT name FROM sqlite_master WHERE type = 'table'"
+        self.assertEqual([], db.conn.execute(tables).fetchall())  # not copied by the constructor on the GUI thread
+        db.open()
+        self.assertIn(("WORDS",), db.conn.execute(tables).fetchall())
+        db.open()  # no-op
+        self.assertLess(0, db.estimate_count(new_only=True))
+
+    def test_direct(self):
+        db = KindleDB(self.db_file)
+        word_id = next(db.fetch_all(new_only=True))[0]["word_id"]
+        db.set_word_mature_without_commit(word_id, 100)
+        db.commit_changes()
+        self.assertEqual(100, self.device_category(word_id))
+
+    def test_batch_update(self):
+        db = KindleDB(self.db_file, snapshot_file=os.path.join(self.dir.name, "snapshot.db"))
+        word_ids = [r["word_id"] for page in db.fetch_all(new_only=True) for r in page][:3]
+        db.set_words_mature_without_commit(word_ids, 100)
+        self.assertEqual({word_id: 100 for word_id in word_ids}, db.unsynced)
+        db.commit_changes()
+        self.assertEqual([100, 100, 100], [self.device_category(word_id) for word_id in word_ids])
+
+    def test_lookups(self):
+        conn = sqlite3.connect(self.db_file)
+        usages = [usage for (usage,) in conn.execute(
+            "SELECT usage FROM LOOKUPS WHERE word_key = 'zh:estate' ORDER BY timestamp DESC")]
+        conn.close()
+        self.assertEqual(2, len(usages))
+
+        def fetch(lookups: str) -> [dict]:
+            db = KindleDB(self.db_file, snapshot_file=os.path.join(self.dir.name, "snapshot.db"), lookups=lookups)
+            records = [r for page in db.fetch_all(new_only=False) for r in page]
+            self.assertEqual(len(records), db.estimate_count(new_only=False))
+            return records
+
+        records = fetch(KindleDB.LOOKUPS_ALL)
+        self.assertEqual(81, len(records))
+        self.assertEqual(2, [r["word_id"] for r in records].count("zh:estate"))
+
+        records = fetch(KindleDB.LOOKUPS_LATEST)
+        self.assertEqual(79, len(records))
+        self.assertEqual([usages[0]], [r["usage"] for r in records if r["word_id"] == "zh:estate"])
+
+        records = fetch(KindleDB.LOOKUPS_MERGED)
+        self.assertEqual(79, len(records))
+        self.assertEqual(["<br>".join(usages)], [r["usage"] for r in records if r["word_id"] == "zh:estate"])
@@ -1,6 +1,10 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import hashlib
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Callable, Dict
 from pyquery import PyQuery
 from html2text import html2text
 
@@ -60,3 +64,152 @@ def clean_html(h: str) -> str:
     #     raise RuntimeError("html_cleaner verification failure")
 
     return ret
+
+
+class _QtRichTextCleaner(HTMLParser):
+    """
+    Single-pass state machine behind clean_html_fast(). Outside <p> everything is skipped. Inside <p>, spans are
+    unwrapped into <b>/<i> and other elements are serialized the way clean_html() does (lxml XML serialization).
+    """
+
+    _VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source",
+                      "track", "wbr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.has_body = False
+        self.out = []  # output pieces
+        self._p_depth = 0
+        self._p_has_br = False
+        self._span_closings = []  # closing tags of open spans
+        self._element_stack = []  # (tag, index in self.out of its start tag) of other open elements inside <p>
+
+    @staticmethod
+    def _escape_text(s: str) -> str:
+        return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+    @staticmethod
+    def _escape_attr(s: str) -> str:
+        return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;") \
+            .replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;")
+
+    def _start_tag(self, tag: str, attrs, close: bool) -> str:
+        ret = "<" + tag
+        for name, value in attrs:
+            ret += ' %s="%s"' % (name, self._escape_attr(value if value is not None else name))
+        return ret + ("/>" if close else ">")
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            self.has_body = True
+        elif tag == "p":
+            if self._p_depth == 0:
+                self._p_has_br = False
+            self._p_depth += 1
+        elif self._p_depth > 0:
+            if tag == "span":
+                style = dict(attrs).get("style") or ""
+                bold = style.find("font-weight:") != -1
+                italic = style.find("font-style:italic;") != -1
+                self.out.append(("<i>" if italic else "") + ("<b>" if bold else ""))
+                self._span_closings.append(("</b>" if bold else "") + ("</i>" if italic else ""))
+            elif tag in self._VOID_ELEMENTS:
+                if tag == "br":
+                    self._p_has_br = True
+                self.out.append(self._start_tag(tag, attrs, close=True))
+            else:
+                self._element_stack.append((tag, len(self.out)))
+                self.out.append(self._start_tag(tag, attrs, close=False))
+
+    def handle_startendtag(self, tag, attrs):
+        if self._p_depth > 0 and tag not in self._VOID_ELEMENTS and tag not in ["p", "span"]:
+            self.out.append(self._start_tag(tag, attrs, close=True))
+        else:
+            self.handle_starttag(tag, attrs)
+            if tag == "span" or (tag == "p" and self._p_depth > 0):
+                self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == "p":
+            if self._p_depth > 0:
+                self._p_depth -= 1
+                if self._p_depth == 0:
+                    if not self._p_has_br:  # avoid duplicate <br> for empty line
+                        self.out.append("<br>")
+                    self._span_closings.clear()
+                    self._element_stack.clear()
+        elif self._p_depth > 0:
+            if tag == "span":
+                if len(self._span_closings) > 0:
+                    self.out.append(self._span_closings.pop())
+            elif tag not in self._VOID_ELEMENTS:
+                # Close the innermost open element of the tag, with the elements opened after it
+                for i in range(len(self._element_stack) - 1, -1, -1):
+                    if self._element_stack[i][0] == tag:
+                        while len(self._element_stack) > i:
+                            t, start = self._element_stack.pop()
+                            if start == len(self.out) - 1:  # no content, serialized as an empty element
+                                self.out[start] = self.out[start][:-1] + "/>"
+                            else:
+                                self.out.append("</%s>" % t)
+                        break
+
+    def handle_data(self, data):
+        if self._p_depth > 0:
+            self.out.append(self._escape_text(data))
+
+
+def clean_html_fast(h: str) -> str:
+    """
+    Single-pass equivalent of clean_html() for Qt rich-text HTML (QTextEdit.toHtml()), without building a document
+    tree. clean_html() stays as the reference implementation. Output is identical for Qt rich text, except when text
+    right after a formatted span contains markup-like characters, which clean_html() re-parses as HTML.
+    """
+    if h == "":
+        return ""
+    parser = _QtRichTextCleaner()
+    parser.feed(h)
+    parser.close()
+    if not parser.has_body:
+        return h
+
+    ret = "".join(parser.out).replace("<br/>", "<br>")
+
+    # Remove last <br>
+    if ret.endswith("<br>"):
+        ret = ret[:-4]
+
+    return ret
+
+
+class CleanHTMLCache:
+    """
+    Bounded LRU memo of an HTML cleaner, keyed by a hash of the input. The same Qt rich text reaches the cleaner
+    repeatedly, e.g. untouched examples, and entries confirmed again after a retract.
+    """
+
+    def __init__(self, max_entries: int = 1024, cleaner: Callable[[str], str] = clean_html_fast):
+        self.max_entries = max_entries
+        self.cleaner = cleaner
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[bytes, str] = OrderedDict()  # input hash -> output, least recently used first
+
+    def clean(self, h: str) -> str:
+        key = hashlib.sha1(h.encode("utf-8")).digest()
+        ret = self._entries.get(key)
+        if ret is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return ret
+        self.misses += 1
+        ret = self._entries[key] = self.cleaner(h)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return ret
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
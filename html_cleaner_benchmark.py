@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# Micro-benchmark of clean_html() against clean_html_fast() over a corpus of QTextEdit.toHtml() outputs.
+# Run: python html_cleaner_benchmark.py
+# Regenerate the corpus (needs PyQt6): QT_QPA_PLATFORM=offscreen python html_cleaner_benchmark.py --generate
+
+import os
+import sys
+import json
+import random
+import sqlite3
+import timeit
+from html_cleaner import clean_html, clean_html_fast
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resource", "html_cleaner_corpus.json")
+
+_app = None  # QApplication of generate_corpus(), kept alive while QTextEdit is used
+
+
+def generate_corpus() -> [str]:
+    """Generate rich text the way the editor does: setHtml() of loaded records, and formatted typing."""
+    global _app
+    from PyQt6 import QtWidgets, QtGui
+
+    _app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    edit = QtWidgets.QTextEdit()
+    corpus = []
+
+    # Examples and sources loaded from the Kindle test database
+    conn = sqlite3.connect(os.path.join(os.path.dirname(CORPUS_FILE), "test_vocab.db"))
+    for word, usage, title, authors in conn.execute(
+            """
+            SELECT WORDS.word, LOOKUPS.usage, BOOK_INFO.title, BOOK_INFO.authors
+            FROM WORDS
+              JOIN LOOKUPS ON WORDS.id = LOOKUPS.word_key
+              JOIN BOOK_INFO ON LOOKUPS.book_key = BOOK_INFO.id
+            """):
+        edit.setHtml(usage.replace(word, "<b>%s</b>" % word))
+        corpus.append(edit.toHtml())
+        edit.setHtml('<div align="right"><div align="right" style="font-size:12px"><I>%s</I>, %s</div></div>' %
+                     (title, authors))
+        corpus.append(edit.toHtml())
+    conn.close()
+
+    # Paraphrases and extensions typed with formatting
+    rng = random.Random(0)
+    pieces = ["adj.", "cn.", "v.", "n.", "to do sth.", "(informal)", "强烈的；猛烈的", "sb's", "Straße", "a & b",
+              "x < y", "y > z", '"quoted"', "it's", "  two spaces", "\ttab", "e.g.", "…", "über", "🍁"]
+    for _ in range(200):
+        edit.clear()
+        cursor = edit.textCursor()
+        for _ in range(rng.randint(1, 12)):
+            fmt = QtGui.QTextCharFormat()
+            if rng.random() < 0.3:
+                fmt.setFontWeight(rng.choice([600, 700]))
+            if rng.random() < 0.3:
+                fmt.setFontItalic(True)
+            if rng.random() < 0.1:
+                fmt.setFontPointSize(rng.choice([10, 12, 18]))
+            cursor.insertText(rng.choice(pieces), fmt)
+            cursor.insertText(" ", QtGui.QTextCharFormat())
+            r = rng.random()
+            if r < 0.15:
+                cursor.insertBlock()
+            elif r < 0.2:
+                cursor.insertBlock()
+                cursor.insertBlock()  # empty line
+        corpus.append(edit.toHtml())
+
+    return corpus
+
+
+def load_corpus() -> [str]:
+    with open(CORPUS_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    if "--generate" in sys.argv:
+        with open(CORPUS_FILE, "w", encoding="utf-8") as f:
+            json.dump(generate_corpus(), f, ensure_ascii=False, indent=0)
+
+    corpus = load_corpus()
+    print("%d documents, %d bytes" % (len(corpus), sum(len(h) for h in corpus)))
+    for func in [clean_html, clean_html_fast]:
+        t = min(timeit.repeat(lambda: [func(h) for h in corpus], number=5, repeat=3)) / 5
+        print("%16s %10.2f us/doc" % (func.__name__, t / len(corpus) * 1E6))
@@ -1,3 +1,5 @@
+import os
+import json
 from unittest import TestCase
 from html_cleaner import *
 
@@ -57,3 +59,40 @@ p, li { white-space: pre-wrap; }
         result = clean_html(raw)
         self.assertEqual(result, "This is <b>too</b> complicated.<br><br><b>REALLY</b><br><br><br><i>III</i>")
 
+
+class HTMLCleanerFastTest(TestCase):
+    def test_corpus(self):
+        # Corpus of QTextEdit.toHtml() outputs, generated by html_cleaner_benchmark.py --generate
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "resource", "html_cleaner_corpus.json"),
+                  "r", encoding="utf-8") as f:
+            corpus = json.load(f)
+        for raw in corpus:
+            self.assertEqual(clean_html(raw), clean_html_fast(raw), raw)
+
+    def test_no_body(self):
+        self.assertEqual("", clean_html_fast(""))
+        self.assertEqual("plain text", clean_html_fast("plain text"))
+
+
+class CleanHTMLCacheTest(TestCase):
+    def test_cached_matches_uncached(self):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "resource", "html_cleaner_corpus.json"),
+                  "r", encoding="utf-8") as f:
+            corpus = json.load(f)
+        cache = CleanHTMLCache(max_entries=len(corpus))
+        for _ in range(2):
+            for raw in corpus:
+                self.assertEqual(clean_html_fast(raw), cache.clean(raw))
+        self.assertEqual(len(set(corpus)), cache.misses)
+        self.assertEqual(len(corpus) * 2 - len(set(corpus)), cache.hits)
+
+    def test_bounded(self):
+        cache = CleanHTMLCache(max_entries=2, cleaner=str.upper)
+        cache.clean("a")
+        cache.clean("b")
+        cache.clean("a")
+        cache.clean("c")  # evicts "b"
+        self.assertEqual({"hits": 1, "misses": 3, "entries": 2}, cache.stats())
+        cache.clean("a")
+        cache.clean("b")
+        self.assertEqual({"hits": 2, "misses": 4, "entries": 2}, cache.stats())
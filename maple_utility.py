@@ -64,12 +64,14 @@ class Ui_MapleUtility(object):
         self.clearList.setObjectName("clearList")
         self.gridLayout.addWidget(self.clearList, 6, 0, 1, 2)
         self.verticalLayout.addWidget(self.groupBox_2)
-        self.entryList = QtWidgets.QListWidget(parent=self.controlArea)
+        self.entryList = QtWidgets.QListView(parent=self.controlArea)
         self.entryList.setEnabled(True)
         font = QtGui.QFont()
         font.setPointSize(14)
         self.entryList.setFont(font)
         self.entryList.setFrameShape(QtWidgets.QFrame.Shape.NoFrame)
+        self.entryList.setLayoutMode(QtWidgets.QListView.LayoutMode.Batched)
+        self.entryList.setUniformItemSizes(True)
         self.entryList.setObjectName("entryList")
         self.verticalLayout.addWidget(self.entryList)
         self.groupBox = QtWidgets.QGroupBox(parent=self.controlArea)
@@ -4,11 +4,15 @@
 
 import sys
 import os
-from typing import Optional, Dict, cast
+from typing import Optional, List, cast
 from PyQt6 import QtCore, QtWidgets, QtGui
 from data_manager import DataManager, Record, RecordStatus
+from record_list_model import RecordListModel, RecordFilterProxyModel
 from maple_utility import Ui_MapleUtility
-from web_query_view import WebQueryView, QueryType, QuerySettings
+from web_query_view import WebQueryView, Query, QueryType, QuerySettings
+from collins_cache import CollinsCache
+from collins_fetcher import CollinsFetcher
+from page_cache import PageCache
 import config
 import webbrowser
 
@@ -25,6 +29,8 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
     MORE_CARDS_THRESHOLD_DE = 5
     MORE_CARDS_DE = "RSD"
 
+    UPCOMING_SCAN_ROWS = 50  # processed entries after the current one are skipped, within this many rows
+
     def __init__(self, parent=None):
 
         # Setup UI and connections
@@ -33,7 +39,6 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
         self.setCentralWidget(self.mainWidget)
         self.confirmButton.clicked.connect(self.confirm_clicked)
         self.discardButton.clicked.connect(self.discard_clicked)
-        self.entryList.selectionModel().selectionChanged.connect(self.selected_changed)
         self.subject.textChanged.connect(self.subject_changed)
         self.subject.installEventFilter(self)  # response to Return key
         self.subjectSuggest.setVisible(False)
@@ -123,8 +128,20 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
         help_action.triggered.connect(lambda: webbrowser.open('https://github.com/liuzikai/Maple-Anki-Utility'))
         help_menu.addAction(help_action)
 
+        # Create the View menu
+        view_menu = menu_bar.addMenu("View")
+
+        # Add "Hide Processed Entries" item to the View menu
+        self.hide_processed_action = QtGui.QAction("Hide Processed Entries", self)
+        self.hide_processed_action.setCheckable(True)
+        self.hide_processed_action.toggled.connect(self.hide_processed_toggled)
+        view_menu.addAction(self.hide_processed_action)
+
         # Setup WebQueryView
-        self.wqv = WebQueryView(self.webViewFrame)
+        self.collins_fetcher = CollinsFetcher()
+        self.page_cache = PageCache()
+        self.wqv = WebQueryView(self.webViewFrame, CollinsCache(os.path.join(config.config_dir, "collins_cache.db")),
+                                self.collins_fetcher, self.page_cache)
         self.wqv.setMinimumSize(QtCore.QSize(0, 0))
         self.wqv.setMaximumSize(QtCore.QSize(16777215, 16777215))
         self.webViewVerticalLayout.insertWidget(0, self.wqv)
@@ -137,14 +154,29 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
 
         # Setup DataManager and connections
         self.data = DataManager(config.save_dir, os.path.join(config.anki_user_dir, "collection.media"))
-        self.data.record_inserted.connect(self.handle_record_insertion)  # cid, batch_loading(True) / add_single(False)
+        self.data.record_inserted.connect(self.handle_record_insertion)  # cid
+        self.data.records_inserted.connect(self.handle_records_insertion)  # range of cids
         self.data.record_status_changed.connect(self.handle_record_status_changed)  # cid, old_status, new_status
         self.data.record_cleared.connect(self.handle_record_clear)
         self.data.record_count_changed.connect(self.update_ui_after_record_count_changed)
+        self.data.batch_load_progress.connect(self.handle_record_batch_load_progress)
+        self.data.batch_load_failed.connect(self.handle_record_batch_load_failed)
         self.data.batch_load_finished.connect(self.handle_record_batch_load_finished)
-
-        # QListWidgetItem can only be deleted when records are cleared
-        self.cid_to_item: Dict[int, QtWidgets.QListWidgetItem] = {}
+        self.data.media_generation_failed.connect(self.handle_media_generation_failed)
+        self.data.db_commit_failed.connect(self.handle_db_commit_failed)
+        self.data.backup_finished.connect(self.handle_backup_finished)
+        self.data.backup_failed.connect(self.handle_backup_failed)
+        try:
+            self.data.recover_exports()
+        except OSError as e:
+            self.report_error("Failed to recover the export of the last session.\n\n" + str(e))
+
+        # Setup entry list model, viewed through a status filter
+        self.entry_model = RecordListModel(self.data, self.entryList.font(), self)
+        self.entry_proxy = RecordFilterProxyModel(self)
+        self.entry_proxy.setSourceModel(self.entry_model)
+        self.entryList.setModel(self.entry_proxy)
+        self.entryList.selectionModel().selectionChanged.connect(self.selected_changed)
 
         # Setup initial UI
         self.change_to_english_mode()
@@ -195,29 +227,30 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
 
     # ================================ Data Manager Related Slots ================================
 
-    @QtCore.pyqtSlot(int, bool)
-    def handle_record_insertion(self, cid: int, batch_loading: bool):
-        subject = self.data.get(cid).subject
-
+    @QtCore.pyqtSlot(int)
+    def handle_record_insertion(self, cid: int):
         self.entryList.selectionModel().blockSignals(True)  # --------- entryList signals blocked -------->
 
-        if batch_loading:
-            row = self.entryList.count()
+        current = self.entryList.currentIndex()
+        if current.isValid():
+            source_row = self.entry_proxy.mapToSource(current).row() + 1  # add item after current row
         else:
-            row = self.entryList.currentRow() + 1  # add item after current row
-        self.entryList.insertItem(row, subject)
+            source_row = 0
+        self.entry_model.insert_cid(source_row, cid)
 
-        item = self.entryList.item(row)
-        item.setData(QtCore.Qt.ItemDataRole.UserRole, cid)
-        self.cid_to_item[cid] = item
+        self.entryList.selectionModel().blockSignals(False)  # <-------- entryList signals unblocked --------
 
+        self.set_current_cid(cid)  # will trigger editor_load_entry()
+        self.subject.setFocus()
+
+    @QtCore.pyqtSlot(range)
+    def handle_records_insertion(self, cids: range):
+        self.entryList.selectionModel().blockSignals(True)  # --------- entryList signals blocked -------->
+        self.entry_model.append_cids(cids)
         self.entryList.selectionModel().blockSignals(False)  # <-------- entryList signals unblocked --------
 
-        if not batch_loading:
-            self.entryList.setCurrentRow(row)  # will trigger editor_load_entry()
-            self.subject.setFocus()
-        else:
-            self.wqv.prefetch_queued(subject, QueryType.COLLINS, cid)
+        for cid in cids:
+            self.wqv.prefetch_queued(self.data.get(cid).subject, QueryType.COLLINS, cid)
 
     @QtCore.pyqtSlot()
     def update_ui_after_record_count_changed(self):
@@ -246,27 +279,60 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
         self.discardBar.setValue(self.data.count(RecordStatus.DISCARDED))
         self.discardBar.setToolTip("%d discarded" % self.discardBar.value())
 
+    @QtCore.pyqtSlot(int, int)
+    def handle_record_batch_load_progress(self, rows_read: int, total_estimate: int):
+        if total_estimate > 0:
+            self.statusBar().showMessage("Loading... %d/%d" % (rows_read, total_estimate))
+        else:
+            self.statusBar().showMessage("Loading... %d" % rows_read)
+        # Start processing as soon as the first page arrives
+        if self.entry_proxy.rowCount() > 0 and not self.entryList.currentIndex().isValid():
+            self.entryList.setCurrentIndex(self.entry_proxy.index(0, 0))
+            self.paraphrase.setFocus()
+
+    @QtCore.pyqtSlot(str)
+    def handle_record_batch_load_failed(self, info: str):
+        self.statusBar().clearMessage()
+        self.report_error(info)
+
     @QtCore.pyqtSlot(bool)
     def handle_record_batch_load_finished(self, is_kindle_db: bool):
-        if self.data.count() > 0:
+        self.statusBar().clearMessage()
+        if self.entry_proxy.rowCount() > 0 and not self.entryList.currentIndex().isValid():
             QtCore.QCoreApplication.processEvents()
-            self.entryList.setCurrentRow(0)
+            self.entryList.setCurrentIndex(self.entry_proxy.index(0, 0))
             self.paraphrase.setFocus()
         self.kindleToThings.setVisible(is_kindle_db)
 
+    @QtCore.pyqtSlot(str, str)
+    def handle_media_generation_failed(self, word: str, info: str):
+        self.statusBar().showMessage('Failed to generate pronunciation of "%s": %s' % (word, info), 10000)
+
+    @QtCore.pyqtSlot(str, str)
+    def handle_backup_finished(self, file: str, archive: str):
+        if archive != "":
+            self.statusBar().showMessage('Backed up "%s"' % os.path.basename(file), 3000)
+
+    @QtCore.pyqtSlot(str, str)
+    def handle_backup_failed(self, file: str, info: str):
+        self.statusBar().showMessage('Failed to back up "%s": %s' % (os.path.basename(file), info), 10000)
+
+    @QtCore.pyqtSlot(str)
+    def handle_db_commit_failed(self, info: str):
+        self.report_error("Failed to save word status to the database.\n\n" + info)
+
     @QtCore.pyqtSlot()
     def handle_record_clear(self):
         self.wqv.reset()
         self.entryList.selectionModel().blockSignals(True)  # --------- entryList signals blocked -------->
-        self.cid_to_item.clear()
-        self.entryList.clear()
+        self.entry_model.clear()
         QtCore.QCoreApplication.processEvents()
         self.entryList.selectionModel().blockSignals(False)  # <-------- entryList signals unblocked --------
         self.kindleToThings.setVisible(False)
+        self.statusBar().clearMessage()  # a running batch load is cancelled on clear
 
     @QtCore.pyqtSlot(int, RecordStatus, RecordStatus)
     def handle_record_status_changed(self, cid: int, old_status: RecordStatus, new_status: RecordStatus):
-        f = self.entryList.font()
         if new_status == RecordStatus.CONFIRMED:
             r = self.data.get(cid)
             if r.pronunciation == "Unknown":
@@ -274,26 +340,24 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
                     r.pronunciation = config.en_voice_1
                 elif self.deutschMode.isChecked():
                     r.pronunciation = config.de_voice_1
-            f.setItalic(True)
-            f.setStrikeOut(False)
             self.wqv.discard_by_cid(cid)
         elif new_status == RecordStatus.DISCARDED:
-            f.setItalic(False)
-            f.setStrikeOut(True)
             self.wqv.discard_by_cid(cid)
-        else:
-            f.setItalic(False)
-            f.setStrikeOut(False)
-        self.cid_to_item[cid].setFont(f)
+        self.entry_model.refresh_cid(cid)  # font is given by the model according to the status
 
     # ================================ Data Related Helper Functions ================================
 
     def cur_cid(self) -> Optional[int]:
-        item = self.entryList.currentItem()
-        if item is None:
+        index = self.entryList.currentIndex()
+        if not index.isValid():
             return None
         else:
-            return item.data(QtCore.Qt.ItemDataRole.UserRole)
+            return index.data(RecordListModel.CidRole)
+
+    def set_current_cid(self, cid: int) -> None:
+        """Select the entry of the cid. The entry must pass the status filter."""
+        source_index = self.entry_model.index(self.entry_model.row_of(cid), 0)
+        self.entryList.setCurrentIndex(self.entry_proxy.mapFromSource(source_index))
 
     def cur_record(self) -> Optional[Record]:
         cid = self.cur_cid()
@@ -357,9 +421,10 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
 
     def move_to_next(self) -> None:
         # Discard by cid will be performed by record_status_changed signal
-        if self.entryList.currentRow() < self.entryList.count() - 1:
+        row = self.entryList.currentIndex().row()
+        if row < self.entry_proxy.rowCount() - 1:
             self.entryList.selectionModel().blockSignals(True)  # --------- entryList signals blocked -------->
-            self.entryList.setCurrentRow(self.entryList.currentRow() + 1)
+            self.entryList.setCurrentIndex(self.entry_proxy.index(row + 1, 0))
             self.selected_changed(manually_requested_query=False, query_immediately=False)  # delay query
             self.entryList.selectionModel().blockSignals(False)  # <-------- entryList signals unblocked --------
         else:
@@ -381,6 +446,16 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
         config_window.finished.connect(self.set_pronunciation_captions)
         config_window.show()
 
+    def closeEvent(self, event):
+        try:
+            self.data.flush_changes()
+        except (RuntimeError, OSError) as e:
+            self.report_error("Failed to save word status to the database.\n\n" + str(e))
+        self.data.close_output()  # do not rely on destructors to write the output file at exit
+        self.collins_fetcher.shutdown()  # do not wait for queued prefetches at exit
+        self.page_cache.close()
+        event.accept()
+
     def eventFilter(self, widget, event):
         if event.type() == QtCore.QEvent.Type.KeyPress:
             key = event.key()
@@ -417,6 +492,32 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
         elif self.deutschMode.isChecked():
             self.pronA.setText(config.de_voice_1)
             self.pronB.setText(config.de_voice_2)
+
+    @QtCore.pyqtSlot(bool)
+    def hide_processed_toggled(self, checked: bool):
+        cid = self.cur_cid()
+        if checked:
+            statuses = {RecordStatus.UNVIEWED, RecordStatus.TOPROCESS}
+        else:
+            statuses = set(RecordStatus)
+
+        self.entryList.selectionModel().blockSignals(True)  # --------- entryList signals blocked -------->
+        self.entry_proxy.set_visible_statuses(statuses)
+        self.entryList.selectionModel().blockSignals(False)  # <-------- entryList signals unblocked --------
+
+        # Keep the current entry if it is still visible, otherwise move to the first visible one. If none is left, only
+        # the editor is disabled, as a view option must not change the data.
+        if cid is not None and self.data.get(cid).status in statuses:
+            self.set_current_cid(cid)
+        elif self.entry_proxy.rowCount() > 0:
+            self.entryList.setCurrentIndex(self.entry_proxy.index(0, 0))
+        else:
+            self.entryList.selectionModel().blockSignals(True)  # --------- entryList signals blocked -------->
+            self.entryList.setCurrentIndex(QtCore.QModelIndex())
+            self.entryList.selectionModel().blockSignals(False)  # <-------- entryList signals unblocked --------
+        if self.data.count() > 0:
+            self.set_gui_enabled(self.entry_proxy.rowCount() > 0)
+
     @QtCore.pyqtSlot()
     def change_to_english_mode(self):
         self.set_pronunciation_captions()
@@ -460,6 +561,8 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
     def selected_changed(self, manually_requested_query: bool = False, query_immediately: bool = True):
         self.editor_load_entry(self.cur_cid())
         r = self.cur_record()
+        # Before requesting, so that upcoming entries come first when prefetches are issued during the request
+        self.wqv.set_upcoming(r.cid, self.upcoming_queries() if self.autoQueryCheck.isChecked() else [])
         if r.subject != "":
             if r.status == RecordStatus.UNVIEWED:
                 self.pronA.click()  # including toggling and first-time pronouncing
@@ -470,6 +573,18 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
                 elif self.autoQueryCheck.isChecked():
                     self.wqv.delay_request(r.subject, QueryType.COLLINS, r.cid)
 
+    def upcoming_queries(self) -> List[Query]:
+        """COLLINS queries of the entries after the current one in the list, as many as may be prefetched."""
+        queries = []
+        row = self.entryList.currentIndex().row() + 1
+        end = min(row + self.UPCOMING_SCAN_ROWS, self.entry_proxy.rowCount())
+        while row < end and len(queries) < self.wqv.get_max_concurrent_prefetches():
+            r = self.data.get(self.entry_proxy.index(row, 0).data(RecordListModel.CidRole))
+            if r.subject != "" and r.status in [RecordStatus.UNVIEWED, RecordStatus.TOPROCESS]:
+                queries.append(Query(r.subject, QueryType.COLLINS, r.cid))
+            row += 1
+        return queries
+
     def get_cur_record_and_revert_save_if_needed(self):
         r = self.cur_record()
         if r.status in [RecordStatus.CONFIRMED, RecordStatus.DISCARDED]:
@@ -490,7 +605,7 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
         # No need to discard wqv queries as all queries associated with the cid will be discarded at once later
         subject = self.subject.toPlainText()
         r.subject = subject
-        self.entryList.currentItem().setText(subject)
+        self.entry_model.refresh_cid(r.cid)
         # Do not query automatically. Wait for Return key.
 
     @QtCore.pyqtSlot()
@@ -569,7 +684,7 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
     def load_kindle_clicked(self) -> None:
         try:
             self.data.reload_kindle_data(KINDLE_DB_FILENAME)
-        except RuntimeError as e:
+        except (RuntimeError, OSError) as e:
             self.report_error(str(e))
 
     @QtCore.pyqtSlot()
@@ -587,7 +702,7 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
                 if csv_dir != config.csv_default_dir:
                     config.csv_default_dir = csv_dir
                     config.save_config_from_variables()
-            except RuntimeError as e:
+            except (RuntimeError, OSError) as e:
                 self.report_error(str(e))
 
     @QtCore.pyqtSlot()
@@ -595,7 +710,7 @@ class MapleUtility(QtWidgets.QMainWindow, Ui_MapleUtility):
         things_list = config.things_vocab_list_en if self.englishMode.isChecked() else config.things_vocab_list_de
         try:
             self.data.reload_things_list(things_list)
-        except RuntimeError as e:
+        except (RuntimeError, OSError) as e:
             self.report_error(str(e))
 
     @staticmethod
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import unicodedata
+from time import time
+from typing import Optional, List, Dict
+
+
+class MediaCache:
+    """
+    Persistent index of generated pronunciation media, keyed on the normalized text and the commands (voice, rate,
+    encoder settings) used to generate it. A hit hands back the filename of the existing file in the media directory.
+    Entries are evicted in LRU order when the index exceeds max_entries or max_bytes. Evicting an entry only drops it
+    from the index: the file stays in the media directory, as cards already imported to Anki may refer to it.
+    """
+
+    def __init__(self, index_file: str, media_path: str, max_entries: int = 20000, max_bytes: int = 200 * 1024 * 1024):
+        self.index_file = index_file
+        self.media_path = media_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}  # key -> {"filename", "size", "last_used"}, least recently used first
+        self._total_bytes = 0
+        self._load()
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @staticmethod
+    def make_key(tts_argv: List[str], encode_argv: List[str]) -> str:
+        """
+        Make a key from the argv of the commands, built with the normalized text and placeholders in place of the file
+        names, so that any change of voice, rate or encoder settings makes a different key.
+        """
+        return hashlib.sha1(json.dumps([tts_argv, encode_argv]).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the media filename of the key, or None if missing or the file has been removed."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not os.path.exists(os.path.join(self.media_path, entry["filename"])):
+                self._remove(key)  # e.g. removed by Check Media of Anki
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry["last_used"] = time()
+            self._entries[key] = self._entries.pop(key)  # move to the most recently used end
+            return entry["filename"]
+
+    def put(self, key: str, filename: str) -> None:
+        """Add a generated media file to the index. The file must exist."""
+        size = os.path.getsize(os.path.join(self.media_path, filename))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {"filename": filename, "size": size, "last_used": time()}
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "bytes": self._total_bytes}
+
+    def save(self) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            # A temporary file of its own, as another instance on the same index may be saving, e.g. from a destructor
+            fd, temp_file = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(self.index_file))
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"media_path": self.media_path, "entries": self._entries}, f)
+            os.replace(temp_file, self.index_file)
+
+    def _remove(self, key: str) -> None:
+        self._total_bytes -= self._entries.pop(key)["size"]
+
+    def _load(self) -> None:
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return  # start over with a broken index
+        if index.get("media_path") != self.media_path:
+            return  # filenames are only meaningful in the same media directory
+        for key, entry in sorted(index["entries"].items(), key=lambda item: item[1]["last_used"]):
+            self._entries[key] = entry
+            self._total_bytes += entry["size"]
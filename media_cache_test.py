@@ -0,0 +1,48 @@
+import os
+import tempfile
+from unittest import TestCase
+from media_cache import *
+
+
+class MediaCacheTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.index_file = os.path.join(self.dir.name, "media_cache.json")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def add_media(self, cache: MediaCache, key: str, size: int) -> None:
+        filename = key + ".mp3"
+        with open(os.path.join(self.dir.name, filename), "wb") as f:
+            f.write(b"\0" * size)
+        cache.put(key, filename)
+
+    def test_lru_eviction_by_count(self):
+        cache = MediaCache(self.index_file, self.dir.name, max_entries=2)
+        self.add_media(cache, "a", 1)
+        self.add_media(cache, "b", 1)
+        self.assertEqual("a.mp3", cache.get("a"))  # b becomes the least recently used
+        self.add_media(cache, "c", 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual("a.mp3", cache.get("a"))
+        self.assertTrue(os.path.exists(os.path.join(self.dir.name, "b.mp3")))  # file is kept for Anki
+
+    def test_eviction_by_size_and_persistence(self):
+        cache = MediaCache(self.index_file, self.dir.name, max_bytes=10)
+        self.add_media(cache, "a", 6)
+        self.add_media(cache, "b", 6)
+        self.assertEqual({"hits": 0, "misses": 0, "entries": 1, "bytes": 6}, cache.stats())
+        cache.save()
+
+        cache = MediaCache(self.index_file, self.dir.name, max_bytes=10)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual("b.mp3", cache.get("b"))
+
+        cache = MediaCache(self.index_file, os.path.join(self.dir.name, "other"))
+        self.assertIsNone(cache.get("b"))
+
+    def test_key(self):
+        self.assertEqual("der Hund", MediaCache.normalize_text("  der \n Hund "))
+        self.assertNotEqual(MediaCache.make_key(["say", "-r", "175", "word"], ["lame", "-m", "m"]),
+                            MediaCache.make_key(["say", "-r", "200", "word"], ["lame", "-m", "m"]))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import Optional, Tuple, Dict
+
+
+class PageCache:
+    """
+    Disk cache of pages evicted from webviews, keyed on the requested URL. A page is stored as its final URL and HTML,
+    to be restored without the network. Entries are evicted in LRU order when the cache exceeds max_bytes. Pages are
+    only kept for the session: without a cache_dir, a temporary directory is used and removed on close().
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 100 * 1024 * 1024):
+        self._temp_dir = tempfile.TemporaryDirectory(prefix="page_cache-") if cache_dir is None else None
+        self.cache_dir = self._temp_dir.name if cache_dir is None else cache_dir
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, int] = {}  # filename -> size, least recently used first
+        self._total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _filename(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json"
+
+    def get(self, url: str) -> Optional[Tuple[str, str]]:
+        """Return (final URL, HTML) of the page, or None if missing."""
+        filename = self._filename(url)
+        with self._lock:
+            if filename not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with open(os.path.join(self.cache_dir, filename), "r", encoding="utf-8") as f:
+                    page = json.load(f)
+            except (OSError, ValueError):
+                self._remove(filename)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries[filename] = self._entries.pop(filename)  # move to the most recently used end
+            return page["final_url"], page["html"]
+
+    def put(self, url: str, final_url: str, html: str) -> None:
+        filename = self._filename(url)
+        data = json.dumps({"url": url, "final_url": final_url, "html": html}).encode("utf-8")
+        with self._lock:
+            if filename in self._entries:
+                self._remove(filename)
+            with open(os.path.join(self.cache_dir, filename), "wb") as f:
+                f.write(data)
+            self._entries[filename] = len(data)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "bytes": self._total_bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            for filename in list(self._entries):
+                self._remove(filename)
+            if self._temp_dir is not None:
+                self._temp_dir.cleanup()
+
+    def _remove(self, filename: str) -> None:
+        self._total_bytes -= self._entries.pop(filename)
+        try:
+            os.remove(os.path.join(self.cache_dir, filename))
+        except OSError:
+            pass
@@ -0,0 +1,30 @@
+import os
+from unittest import TestCase
+from page_cache import *
+
+
+class PageCacheTest(TestCase):
+    def test_put_get(self):
+        cache = PageCache()
+        self.assertIsNone(cache.get("https://example.com/ran"))
+        cache.put("https://example.com/ran", "https://example.com/run", "<html>run 🏃</html>")
+        self.assertEqual(("https://example.com/run", "<html>run 🏃</html>"), cache.get("https://example.com/ran"))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+        cache_dir = cache.cache_dir
+        cache.close()
+        self.assertFalse(os.path.exists(cache_dir))  # only kept for the session
+
+    def test_lru_eviction(self):
+        cache = PageCache(max_bytes=250)
+        cache.put("a", "a", "x" * 50)
+        cache.put("b", "b", "x" * 50)
+        self.assertIsNotNone(cache.get("a"))  # b becomes the least recently used
+        cache.put("c", "c", "x" * 50)
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(2, cache.stats()["entries"])
+        self.assertEqual(2, len(os.listdir(cache.cache_dir)))
+        cache.close()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from typing import Optional, List, Dict, Set
+from PyQt6 import QtCore, QtGui
+from data_manager import DataManager, RecordStatus
+
+
+class RecordListModel(QtCore.QAbstractListModel):
+    """
+    List model of the entries, backed directly by the records of a DataManager. The model only keeps the order of
+    cids, as single entries can be inserted in the middle while cids always grow.
+    """
+
+    CidRole = QtCore.Qt.ItemDataRole.UserRole
+    StatusRole = QtCore.Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, data: DataManager, font: QtGui.QFont, parent: Optional[QtCore.QObject] = None) -> None:
+        super().__init__(parent)
+        self._data = data
+        self._cids: List[int] = []  # row -> cid
+        self._rows: Dict[int, int] = {}  # cid -> row
+
+        # Fonts by status. None to use the font of the view.
+        confirmed_font = QtGui.QFont(font)
+        confirmed_font.setItalic(True)
+        discarded_font = QtGui.QFont(font)
+        discarded_font.setStrikeOut(True)
+        self._fonts: Dict[RecordStatus, Optional[QtGui.QFont]] = {
+            RecordStatus.UNVIEWED: None,
+            RecordStatus.TOPROCESS: None,
+            RecordStatus.CONFIRMED: confirmed_font,
+            RecordStatus.DISCARDED: discarded_font
+        }
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._cids)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._cids):
+            return None
+        cid = self._cids[index.row()]
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return self._data.get(cid).subject
+        elif role == QtCore.Qt.ItemDataRole.FontRole:
+            return self._fonts[self._data.get(cid).status]
+        elif role == self.CidRole:
+            return cid
+        elif role == self.StatusRole:
+            return self._data.get(cid).status
+        return None
+
+    def row_of(self, cid: int) -> int:
+        return self._rows[cid]
+
+    def append_cids(self, cids: range) -> None:
+        """Append rows of a range of cids at once."""
+        if len(cids) == 0:
+            return
+        first = len(self._cids)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(cids) - 1)
+        for cid in cids:
+            self._rows[cid] = len(self._cids)
+            self._cids.append(cid)
+        self.endInsertRows()
+
+    def insert_cid(self, row: int, cid: int) -> None:
+        """Insert a single cid at the given row."""
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self._cids.insert(row, cid)
+        for r in range(row, len(self._cids)):  # single insertion is manual, so the shift is acceptable
+            self._rows[self._cids[r]] = r
+        self.endInsertRows()
+
+    def refresh_cid(self, cid: int) -> None:
+        """Notify views that the subject or status of a cid has changed."""
+        index = self.index(self._rows[cid], 0)
+        self.dataChanged.emit(index, index, [QtCore.Qt.ItemDataRole.DisplayRole, QtCore.Qt.ItemDataRole.FontRole,
+                                             self.StatusRole])
+
+    def clear(self) -> None:
+        self.beginResetModel()
+        self._cids.clear()
+        self._rows.clear()
+        self.endResetModel()
+
+
+class RecordFilterProxyModel(QtCore.QSortFilterProxyModel):
+    """
+    Filter entries of a RecordListModel by RecordStatus. The filter is applied when set_visible_statuses() is called,
+    rather than on every status change, so that processing an entry does not make it vanish under the cursor.
+    """
+
+    def __init__(self, parent: Optional[QtCore.QObject] = None) -> None:
+        super().__init__(parent)
+        self.setDynamicSortFilter(False)
+        self._visible_statuses: Set[RecordStatus] = set(RecordStatus)
+
+    def set_visible_statuses(self, statuses: Set[RecordStatus]) -> None:
+        self._visible_statuses = set(statuses)
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QtCore.QModelIndex) -> bool:
+        if len(self._visible_statuses) == len(RecordStatus):
+            return True  # fast path for batch loading without filter
+        status = self.sourceModel().index(source_row, 0, source_parent).data(RecordListModel.StatusRole)
+        return status in self._visible_statuses
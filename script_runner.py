@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import List, Tuple, Dict
+
+
+class ScriptRunner(ABC):
+    """
+    Things 3 operations used by ThingsDB. A to-do is a tuple of (name, notes). To-dos are looked up by name.
+    """
+
+    @abstractmethod
+    def fetch_todos(self, project: str) -> List[Tuple[str, str]]:
+        """
+        Fetch all to-dos of the project.
+        Can throw RuntimeError.
+        """
+        pass
+
+    @abstractmethod
+    def add_todos(self, project: str, todos: List[Tuple[str, str]]) -> None:
+        """
+        Add to-dos at the end of the project.
+        Can throw RuntimeError.
+        """
+        pass
+
+    @abstractmethod
+    def move_todos(self, project: str, moves: Dict[str, bool], wait: bool = True) -> None:
+        """
+        Move to-dos between the project and the Trash. A to-do failing to move (e.g. renamed) does not stop the others.
+        Can throw RuntimeError if wait is True.
+        :param project: Project of the to-dos
+        :param moves: name -> True to move from the project to the Trash, False to move from the Trash back
+        :param wait: False to return immediately and ignore errors
+        """
+        pass
+
+
+def applescript_string(s: str) -> str:
+    return '"%s"' % s.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class OsascriptRunner(ScriptRunner):
+    """Run the operations as AppleScript through osascript. Each operation is one osascript process."""
+
+    @staticmethod
+    def run(script: str, wait: bool = True) -> str:
+        """
+        Run an AppleScript and return its output. If wait is False, return "" without waiting for it to finish.
+        Throw RuntimeError with the error output if the script fails.
+        """
+        if not wait:
+            p = subprocess.Popen(["osascript"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.DEVNULL)
+            p.stdin.write(script.encode())
+            p.stdin.close()
+            return ""
+        p = subprocess.Popen(["osascript"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate(script.encode())
+        if p.returncode != 0:
+            raise RuntimeError(err.decode("utf-8"))
+        return out.decode("utf-8")
+
+    def fetch_todos(self, project: str) -> List[Tuple[str, str]]:
+        script = """
+            set retList to {}
+            tell application "Things3"
+                repeat with toDo in to dos of project %s
+                    set end of retList to (name of toDo & "😅" & notes of toDo)
+                end repeat
+            end tell
+            set AppleScript's text item delimiters to "🥲"
+            set retString to retList as string
+            return retString
+        """ % applescript_string(project)
+        todos = []
+        for entry in self.run(script).split("🥲"):
+            entry = entry.strip()
+            if len(entry) == 0:
+                continue
+            p = entry.split("😅")
+            assert len(p) == 2, "Invalid applescript output entry"
+            todos.append((p[0], p[1]))
+        return todos
+
+    def add_todos(self, project: str, todos: List[Tuple[str, str]]) -> None:
+        script = """
+            tell application "Things3"
+        """
+        for name, notes in todos:
+            script += """
+                make new to do with properties {name:%s, notes:%s} at the end of project %s
+            """ % (applescript_string(name), applescript_string(notes), applescript_string(project))
+        script += """
+            end tell
+        """
+        self.run(script)
+
+    def move_todos(self, project: str, moves: Dict[str, bool], wait: bool = True) -> None:
+        script = """
+            tell application "Things3"
+                set proj to project %s
+        """ % applescript_string(project)
+        for name, to_trash in moves.items():
+            if to_trash:
+                script += """
+                try
+                    delete to do named %s of proj
+                end try
+                """ % applescript_string(name)
+            else:
+                script += """
+                try
+                    set project of to do named %s of list "Trash" to proj
+                end try
+                """ % applescript_string(name)
+        script += """
+            end tell
+        """
+        self.run(script, wait)
+
+
+class FakeThingsRunner(ScriptRunner):
+    """
+    In-process stand-in for Things 3, for tests and benchmarks off macOS. Each operation costs `latency` seconds (an
+    osascript process and its Apple Event round trips) plus `item_latency` seconds per to-do touched. Like Things,
+    operations are served one at a time. Operations not waited for run on their own threads.
+    """
+
+    def __init__(self, projects: Dict[str, List[Tuple[str, str]]], latency: float = 0, item_latency: float = 0):
+        self.projects = {project: list(todos) for project, todos in projects.items()}
+        self.trash: List[Tuple[str, str]] = []
+        self.latency = latency
+        self.item_latency = item_latency
+        self.calls: List[str] = []  # names of operations, in the order they are served
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def _serve(self, operation: str, items: int) -> None:
+        """Called with the lock held."""
+        self.calls.append(operation)
+        time.sleep(self.latency + self.item_latency * items)
+
+    def fetch_todos(self, project: str) -> List[Tuple[str, str]]:
+        with self._lock:
+            if project not in self.projects:
+                raise RuntimeError("Can't get project \"%s\"." % project)
+            self._serve("fetch_todos", len(self.projects[project]))
+            return list(self.projects[project])
+
+    def add_todos(self, project: str, todos: List[Tuple[str, str]]) -> None:
+        with self._lock:
+            if project not in self.projects:
+                raise RuntimeError("Can't get project \"%s\"." % project)
+            self._serve("add_todos", len(todos))
+            self.projects[project].extend(todos)
+
+    def move_todos(self, project: str, moves: Dict[str, bool], wait: bool = True) -> None:
+        if not wait:
+            thread = threading.Thread(target=self._move_todos_ignoring_errors, args=(project, dict(moves)))
+            self._threads.append(thread)
+            thread.start()
+            return
+        with self._lock:
+            if project not in self.projects:
+                raise RuntimeError("Can't get project \"%s\"." % project)
+            self._serve("move_todos", len(moves))
+            todos = self.projects[project]
+            for name, to_trash in moves.items():
+                src, dst = (todos, self.trash) if to_trash else (self.trash, todos)
+                for i, todo in enumerate(src):
+                    if todo[0] == name:
+                        dst.append(src.pop(i))
+                        break
+
+    def _move_todos_ignoring_errors(self, project: str, moves: Dict[str, bool]) -> None:
+        try:
+            self.move_todos(project, moves)
+        except RuntimeError:
+            pass
+
+    def join(self) -> None:
+        """Wait for operations not waited for."""
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
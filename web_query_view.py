@@ -1,14 +1,19 @@
-from typing import Optional, Union, List, Deque, Callable, cast
+from typing import Optional, Union, List, Deque, Callable, Dict, Tuple, Set, cast
+import math
+from time import monotonic, perf_counter
 from enum import Enum
 from dataclasses import dataclass
 from collections import deque
+from concurrent.futures import Future
 
 from PyQt6 import QtWidgets, QtCore
 
 # from PyQt6.QtWebEngineWidgets import QWebEngineView as QWebView
 from QWebKitView import QWebKitView as QWebView
 
-from pyquery import PyQuery
+from collins_cache import CollinsCache
+from collins_fetcher import CollinsFetcher, CollinsPage, parse_collins_freq
+from page_cache import PageCache
 
 
 class QueryType(Enum):
@@ -18,7 +23,7 @@ class QueryType(Enum):
     GOOGLE = 3
 
 
-@dataclass
+@dataclass(frozen=True)
 class Query:
     subject: str
     query_type: QueryType
@@ -47,6 +52,9 @@ class QueryWorker(QtWidgets.QWidget):
     collins_suggestion_retrieved = QtCore.pyqtSignal(Query, str)  # query, suggestion
     collins_freq_retrieved = QtCore.pyqtSignal(Query, int, str)  # query, freq, freq_note
 
+    query_finished = QtCore.pyqtSignal(Query, bool, float)  # query, ok, load time [s]
+    page_measured = QtCore.pyqtSignal(int)  # size of the loaded page [characters of HTML]
+
     # Internal constants
 
     _MAC_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_3) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/13.0.5 Safari/605.1.15"
@@ -61,12 +69,18 @@ class QueryWorker(QtWidgets.QWidget):
         """
 
     _TIMEOUT = 20000  # [ms]
+    _BLANK_URL = "about:blank"
 
     @staticmethod
-    def _get_url(query_type: QueryType, subject: str = "") -> str:
+    def preprocess_subject(subject: str) -> str:
+        """Return the subject as it appears in the URL."""
         if QuerySettings["PreprocessSubject"] is not None:
             subject = QuerySettings["PreprocessSubject"](subject)
-        subject = subject.strip().replace(" ", "-")
+        return subject.strip().replace(" ", "-")
+
+    @staticmethod
+    def _get_url(query_type: QueryType, subject: str = "") -> str:
+        subject = QueryWorker.preprocess_subject(subject)
         if query_type == QueryType.COLLINS:
             return u"https://www.collinsdictionary.com/dictionary/%s/%s" % (QuerySettings["CollinsDirectory"], subject)
         elif query_type == QueryType.GOOGLE_IMAGE:
@@ -83,6 +97,15 @@ class QueryWorker(QtWidgets.QWidget):
         self._query: Optional[Query] = None
         self._progress: int = 0
         self._working_on_query: bool = False
+        self._load_ok: bool = False
+        self._load_started: float = 0  # [s] monotonic
+        self._collins_suggestion: Optional[str] = None
+        self._collins_freq: Optional[Tuple[int, str]] = None
+        self._url: str = ""  # requested URL of the query
+        self._page_size: int = 0
+        self._page_html: Optional[str] = None  # cleaned HTML of a COLLINS page, to be cached if evicted
+        self._resetting: bool = False  # the blank page loaded by reset() may not have finished
+        self._stale_blank: bool = False  # a loadFinished of the blank page may still arrive after starting a query
 
         # Create a QWebEngineView centralized in a QHBoxLayout
         self._webview: QWebView = QWebView(self)
@@ -109,12 +132,51 @@ class QueryWorker(QtWidgets.QWidget):
 
     def start(self, query: Query) -> None:
         """Start a query."""
-        self._query = query
-        self._webview.load(QtCore.QUrl(self._get_url(query.query_type, query.subject)))
+        self._reset_query(query, self._get_url(query.query_type, query.subject))
+        self._webview.load(QtCore.QUrl(self._url))
         self._working_on_query = True
         self._timer.start(self._TIMEOUT)
         QtCore.QCoreApplication.processEvents()
 
+    def restore(self, query: Query, url: str, final_url: str, html: str) -> None:
+        """Start a query with the page loaded before, without the network."""
+        self._reset_query(query, url)
+        self._working_on_query = True  # before setHtml(), which may finish loading at once
+        self._webview.setHtml(html, QtCore.QUrl(final_url))
+        self._timer.start(self._TIMEOUT)
+        QtCore.QCoreApplication.processEvents()
+
+    def can_restore(self) -> bool:
+        """Whether restore() is supported. QWebKitView may not implement setHtml()."""
+        return hasattr(self._webview, "setHtml")
+
+    def _reset_query(self, query: Query, url: str) -> None:
+        # Finish the blank load of reset() while not working on a query, so that a late loadFinished of it is ignored
+        # instead of finishing the new query
+        if self._resetting:
+            self._webview.stop()
+            QtCore.QCoreApplication.processEvents()
+        self._stale_blank = self._resetting  # still not finished
+        self._resetting = False
+        self._query = query
+        self._url = url
+        self._load_ok = False
+        self._load_started = monotonic()
+        self._collins_suggestion = None
+        self._collins_freq = None
+        self._page_size = 0
+        self._page_html = None
+
+    def reset(self) -> None:
+        """Release the page and the history of a free worker, keeping the webview to be reused."""
+        self._webview.stop()
+        self._resetting = True
+        self._webview.load(QtCore.QUrl(self._BLANK_URL))
+        if hasattr(self._webview, "history"):  # QWebKitView may not implement history()
+            self._webview.history().clear()
+        self._page_size = 0
+        self._page_html = None
+
     def stop(self) -> None:
         self._webview.stop()
         QtCore.QCoreApplication.processEvents()
@@ -134,12 +196,49 @@ class QueryWorker(QtWidgets.QWidget):
     def get_progress(self) -> int:
         return self._progress
 
+    def load_succeeded(self) -> bool:
+        """Whether the last load finished without error or timeout."""
+        return self._load_ok
+
+    def get_collins_suggestion(self) -> Optional[str]:
+        """Suggestion parsed from the final URL of the last COLLINS query, or None."""
+        return self._collins_suggestion
+
+    def get_collins_freq(self) -> Optional[Tuple[int, str]]:
+        """(freq, freq_note) parsed from the page of the last COLLINS query, or None if not yet."""
+        return self._collins_freq
+
+    def get_url(self) -> str:
+        """Requested URL of the query."""
+        return self._url
+
+    def get_page_url(self) -> str:
+        """URL of the page shown, possibly redirected."""
+        return self._webview.page().url().url()
+
+    def get_page_size(self) -> int:
+        """Characters of HTML of the loaded page, 0 if not measured yet."""
+        return self._page_size
+
+    def get_page_html(self) -> Optional[str]:
+        """HTML of a loaded COLLINS page, or None."""
+        return self._page_html
+
     @QtCore.pyqtSlot(bool)
     def _handle_load_finished(self, ok: bool):
         self._timer.stop()
 
+        if not self._working_on_query:
+            self._resetting = False  # the blank page of reset() has finished, if loading
+        stale_blank, self._stale_blank = self._stale_blank, False
+        if self._working_on_query and stale_blank and not ok:
+            return  # late loadFinished of the blank page of reset() aborted by the query, which is still loading
+
         if self._working_on_query:  # loadFinished can be triggered by manual browsing
             self._working_on_query = False  # set this before emitting any signal
+            self._load_ok = ok
+            if self._query is not None:
+                self.query_finished.emit(self._query, ok, monotonic() - self._load_started)
 
             # self._query may be None due to async
             if self._query is not None and self._query.query_type == QueryType.COLLINS:
@@ -152,12 +251,18 @@ class QueryWorker(QtWidgets.QWidget):
 
                 # Parse suggestion
                 suggestion = self._get_word_from_collins_url(sender.page().url().url())
+                self._collins_suggestion = suggestion
                 if suggestion is not None:
                     self.collins_suggestion_retrieved.emit(self._query, suggestion)
 
                 # Retrieve freq and note
                 sender.page().runJavaScript("document.documentElement.outerHTML", self._collins_web_to_html_callback)
 
+            elif self._query is not None:
+                query = self._query
+                self._webview.page().runJavaScript("document.documentElement.outerHTML.length",
+                                                   lambda length: self._page_length_callback(query, length))
+
         self._handle_progress_change(-1)
 
     @QtCore.pyqtSlot(int)
@@ -188,8 +293,18 @@ class QueryWorker(QtWidgets.QWidget):
     def _collins_web_to_html_callback(self, html: str):
         if self._query is None:  # this can happen due to async callback
             return
+        self._page_html = html
+        self._page_size = len(html)
         (freq, note) = self._parse_collins_freq(html)
+        self._collins_freq = (freq, note)
         self.collins_freq_retrieved.emit(self._query, freq, note)
+        self.page_measured.emit(self._page_size)  # last, as the page may be evicted
+
+    def _page_length_callback(self, query: Query, length):
+        if self._query is not query or not isinstance(length, (int, float)):  # freed or restarted since
+            return
+        self._page_size = int(length)
+        self.page_measured.emit(self._page_size)
 
     @staticmethod
     def _parse_collins_freq(html: str) -> (int, str):
@@ -198,17 +313,7 @@ class QueryWorker(QtWidgets.QWidget):
         :param html:
         :return: (freq, note)
         """
-        try:
-            doc = PyQuery(html)
-            freq_obj = doc(".word-frequency-img")
-            if freq_obj is None:
-                return 0, "Fail to find the word"
-            freq_attr = freq_obj.attr("data-band")
-            if freq_attr is None:
-                return 0, "Fail to find the word"
-            return int(freq_attr), freq_obj.attr("title")
-        except Exception as err:
-            return 0, str(err)
+        return parse_collins_freq(html)
 
 
 class WebQueryView(QtWidgets.QWidget):
@@ -220,33 +325,117 @@ class WebQueryView(QtWidgets.QWidget):
     collins_suggestion_retrieved = QtCore.pyqtSignal(int, str)  # cid, suggestion
     collins_freq_retrieved = QtCore.pyqtSignal(int, int, str)  # cid, freq, freq_note
 
+    # Internal signal to bring fetched pages from the fetcher threads to the GUI thread
+    _collins_page_fetched = QtCore.pyqtSignal(int, CollinsPage)  # fetch id, page
+
     _PREFETCH_LENGTH = 5
-    _PREFETCH_ISSUE_INTERVAL = 5000  # [ms]
     _DELAY_REQUEST_TIME = 2000  # [ms]
-
-    def __init__(self, parent: Optional['QtWidgets.QWidget'] = None) -> None:
+    _UPDATE_INTERVAL = 100  # [ms] usage and progress of the active worker are emitted at most 10 times a second
+
+    # Budget of the pool of workers. Memory of webviews is not measurable, so it's estimated from the size of the pages.
+    _MAX_WORKERS = 15
+    _MAX_MEMORY = 1024 * 1024 * 1024  # [bytes]
+    _WORKER_MEMORY = 30 * 1024 * 1024  # [bytes] a webview with a blank page
+    _PAGE_MEMORY_FACTOR = 20  # [bytes] a loaded page per character of its HTML, for its DOM, layout and images
+
+    # Creating a webview is expensive. Free workers are reset and reused. Those beyond _PREFETCH_LENGTH are destroyed
+    # one per _SHRINK_INTERVAL, only after being free for _SHRINK_DELAY, so that bursts of queries don't create and
+    # destroy webviews over and over.
+    _SHRINK_DELAY = 60.0  # [s]
+    _SHRINK_INTERVAL = 5000  # [ms]
+
+    # Prefetch depth of upcoming entries is tuned to load time / dwell time, both as exponential moving averages
+    _INITIAL_DWELL_TIME = 10.0  # [s]
+    _INITIAL_LOAD_TIME = 3.0  # [s]
+    _MAX_DWELL_TIME = 120.0  # [s] longer stays on an entry are breaks, not counted
+    _AVERAGE_WEIGHT = 0.3  # of the latest sample
+
+    def __init__(self, parent: Optional['QtWidgets.QWidget'] = None,
+                 collins_cache: Optional[CollinsCache] = None,
+                 collins_fetcher: Optional[CollinsFetcher] = None,
+                 page_cache: Optional[PageCache] = None) -> None:
 
         super().__init__(parent)
 
+        # Pages evicted over the budget are stored in the cache, if any, and restored from it when queried again. Only
+        # COLLINS pages are, as others are made by scripts rather than being static documents.
+        self._page_cache = page_cache
+        self._max_workers = self._MAX_WORKERS
+        self._max_memory = self._MAX_MEMORY
+        self._evicted_count = 0
+        self._restored_count = 0
+
+        # Suggestions and frequencies of COLLINS queries found in the cache are emitted without loading the page
+        self._collins_cache = collins_cache
+
+        # Queued COLLINS prefetches are fetched without rendering, leaving the webviews to the pages to be shown
+        self._collins_fetcher = collins_fetcher
+        self._collins_fetches: Dict[int, Tuple[Query, Future]] = {}  # fetch id -> (query, future), in flight
+        self._fetch_of_url: Dict[str, int] = {}
+        self._cids_of_fetch: Dict[int, Dict[int, None]] = {}  # fetch id -> ordered set of subscribed cids
+        self._fetch_ids_by_cid: Dict[int, Set[int]] = {}
+        self._next_fetch_id = 0
+        self._collins_page_fetched.connect(self._handle_collins_page_fetched)
+
         self._layout = QtWidgets.QStackedLayout(self)
         self._layout.setContentsMargins(0, 0, 0, 0)
 
-        # List of workers
+        # List of workers, indexed by state and URL. Only _start_worker(), _free_worker() and
+        # _handle_query_finished() change the state of a worker. Queries of the same URL share a worker: the cids of
+        # all of them subscribe to it, to get its COLLINS results, and it's freed once all of them are discarded.
         self._workers: List[QueryWorker] = []
         self._active_worker: Optional[QueryWorker] = None
-
-        # Create prefetch workers
-        for i in range(self._PREFETCH_LENGTH):
-            self._allocate_a_new_worker()
-
-        # Create prefetch timer
+        self._free_workers: List[QueryWorker] = []  # stack, the most recently freed last
+        self._working_workers: Dict[QueryWorker, None] = {}  # ordered set
+        self._finished_workers: Dict[QueryWorker, None] = {}  # ordered set, the least recently used first
+        self._worker_of_url: Dict[str, QueryWorker] = {}
+        self._cids_of_worker: Dict[QueryWorker, Dict[int, None]] = {}  # ordered set of subscribed cids
+        self._workers_by_cid: Dict[int, Set[QueryWorker]] = {}
+        self._free_since: Dict[QueryWorker, float] = {}  # [s] monotonic
+
+        # Durations of pool operations: operation -> {"count", "total_ms", "max_ms"}
+        self._timings: Dict[str, Dict[str, float]] = {
+            operation: {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            for operation in ["allocate", "reuse", "reset", "destroy"]}
+
+        # Create a worker for the first request, and the other prefetch workers once the event loop runs
+        self._allocate_a_new_worker()
+        QtCore.QTimer.singleShot(0, self._warm_up)
+
+        # Create timer to shrink the pool
+        self._shrink_timer = QtCore.QTimer()
+        self._shrink_timer.setSingleShot(False)  # repeatedly while there are surplus workers
+        self._shrink_timer.timeout.connect(self._shrink_workers)
+
+        # Create prefetch timer, started with no delay to coalesce the events which may let a prefetch be issued
         self._prefetch_timer = QtCore.QTimer()
-        self._prefetch_timer.setSingleShot(False)  # repeatedly
+        self._prefetch_timer.setSingleShot(True)
         self._prefetch_timer.timeout.connect(self._issue_prefetch)
-        self._prefetch_timer.start(self._PREFETCH_ISSUE_INTERVAL)
 
-        # List of queries to prefetch
-        self._queue: Deque[Query] = deque()
+        # Queries to prefetch: upcoming entries after the selected one first, then the queue
+        self._upcoming: List[Query] = []
+        self._queue: Deque[Query] = deque()  # may contain discarded queries, skipped when popped
+        self._queued_by_cid: Dict[int, Set[Query]] = {}  # queries in the queue not discarded
+        self._max_concurrent_prefetches = self._PREFETCH_LENGTH
+
+        # Measured user and network pace
+        self._selected_cid: Optional[int] = None
+        self._selected_time: float = 0  # [s] monotonic
+        self._dwell_time = self._INITIAL_DWELL_TIME
+        self._load_time = self._INITIAL_LOAD_TIME
+
+        # Usage and progress are emitted at once, then coalesced until the timer times out, only if changed
+        self._update_timer = QtCore.QTimer()
+        self._update_timer.setSingleShot(True)
+        self._update_timer.timeout.connect(self._update_timeout)
+        self._usage_dirty = False
+        self._pending_progress: Optional[int] = None  # of the active worker
+        self._last_usage: Optional[Tuple[int, int, int]] = None
+        self._last_progress: Optional[int] = None
+        self._usage_events = 0
+        self._usage_emitted = 0
+        self._progress_events = 0
+        self._progress_emitted = 0
 
         # Timer to handle delayed queries
         self._delay_request: Optional[Query] = None
@@ -256,30 +445,77 @@ class WebQueryView(QtWidgets.QWidget):
 
     def prefetch_queued(self, subject: str, query_type: QueryType, cid: int) -> None:
         """Put a prefetch request to the end of the queue."""
-        self._queue.append(Query(subject, query_type, cid))
+        query = Query(subject, query_type, cid)
+        if self._emit_cached_collins(query):
+            return
+        if self._subscribe_to_worker(query):
+            return
+        if self._collins_fetcher is not None and query_type == QueryType.COLLINS:
+            self._fetch_collins(query)
+            return
+        self._enqueue(query)
+        self._schedule_prefetch()
+
+    def set_upcoming(self, cid: int, upcoming: List[Query]) -> None:
+        """
+        Tell that the entry of the cid is selected, followed by the upcoming queries in the list order. The first
+        get_prefetch_depth() of them are prefetched before the queue. Time between selections of different entries is
+        measured as the dwell time.
+        """
+        now = monotonic()
+        if cid != self._selected_cid:
+            if self._selected_cid is not None and now - self._selected_time < self._MAX_DWELL_TIME:
+                self._dwell_time += self._AVERAGE_WEIGHT * (now - self._selected_time - self._dwell_time)
+            self._selected_cid = cid
+            self._selected_time = now
+        self._upcoming = list(upcoming)
+        self._schedule_prefetch()
+
+    def set_max_concurrent_prefetches(self, count: int) -> None:
+        """Set the max number of pages being prefetched at the same time, which also caps the prefetch depth."""
+        self._max_concurrent_prefetches = max(count, 0)
+        self._schedule_prefetch()
+
+    def get_max_concurrent_prefetches(self) -> int:
+        return self._max_concurrent_prefetches
+
+    def get_prefetch_depth(self) -> int:
+        """
+        Number of upcoming entries to prefetch: enough to have the page ready when the user gets to it, plus one.
+        """
+        depth = math.ceil(self._load_time / max(self._dwell_time, 0.1)) + 1
+        return max(1, min(depth, self._max_concurrent_prefetches))
 
     def prefetch_immediately(self, subject: str, query_type: QueryType, cid: int) -> None:
         """Prefetch a webpage immediately."""
+        if self._emit_cached_collins(Query(subject, query_type, cid)):
+            return
         self._prefetch_immediately(subject, query_type, cid)
 
     def _prefetch_immediately(self, subject: str, query_type: QueryType, cid: int) -> QueryWorker:
         """Internal implementation of prefetch_immediately and return the worker for the query."""
         query = Query(subject, query_type, cid)
 
-        # Check whether there is a worker working on the query
+        # Check whether there is a worker working on the URL, maybe for another cid
         worker = self._search_worker_working_on_query(query)
         if worker is not None:
+            self._subscribe(worker, cid)
             return worker
 
-        # Issue prefetch
-        worker = self._get_a_free_worker()
+        # Issue prefetch, with the least recently used page if the pool is full
+        worker = self._get_a_free_worker(allow_active=True)
+        if worker is None and len(self._workers) >= self._max_workers:
+            worker = self._get_an_evictable_worker(include_upcoming=True)
+            if worker is not None:
+                self._evict_worker(worker, reset=False)
         if worker is None:
             worker = self._allocate_a_new_worker()
-        worker.start(query)
+        self._start_worker(worker, query)
         return worker
 
     def request(self, subject: str, query_type: QueryType, cid: int) -> None:
         """Show a webpage."""
+        self._emit_cached_collins(Query(subject, query_type, cid))  # the page is still loaded to be shown
         worker = self._prefetch_immediately(subject, query_type, cid)
         # If the query is already prefetched, return the worker that is loading or has loaded the query
         # Is not, the returned worker is assigned to fetch the query
@@ -293,17 +529,25 @@ class WebQueryView(QtWidgets.QWidget):
         self._delay_request_timer.start(self._DELAY_REQUEST_TIME)
 
     def discard_by_cid(self, cid: int):
-        # Search in workers
-        for worker in self._workers:
-            if worker.get_query() is not None and worker.get_query().cid == cid:
-                worker.free()
-        self._recycle_workers()
-        self.report_worker_usage()
+        # Search in workers, freeing those without other subscribers
+        for worker in list(self._workers_by_cid.pop(cid, ())):
+            cids = self._cids_of_worker[worker]
+            del cids[cid]
+            if len(cids) == 0:
+                self._free_worker(worker)
+        self._update_usage()
 
         # Search in queue
-        for query in list(self._queue):
-            if query.cid == cid:
-                self._queue.remove(query)
+        self._queued_by_cid.pop(cid, None)
+        self._upcoming = [query for query in self._upcoming if query.cid != cid]
+        self._schedule_prefetch()  # a worker may have been freed
+
+        # Search in fetches, cancelling those without other subscribers
+        for fetch_id in self._fetch_ids_by_cid.pop(cid, ()):
+            cids = self._cids_of_fetch[fetch_id]
+            del cids[cid]
+            if len(cids) == 0:
+                self._pop_fetch(fetch_id)[1].cancel()
 
     def force_stop_active_worker(self) -> None:
         if self._active_worker is not None:
@@ -311,117 +555,515 @@ class WebQueryView(QtWidgets.QWidget):
 
     def reset(self) -> None:
         self._queue.clear()  # clear this first to avoid any new prefetch
+        self._queued_by_cid.clear()
+        self._upcoming.clear()
+        self._selected_cid = None
+        for query, future in self._collins_fetches.values():
+            future.cancel()
+        self._collins_fetches.clear()
+        self._fetch_of_url.clear()
+        self._cids_of_fetch.clear()
+        self._fetch_ids_by_cid.clear()
         self._set_active_worker(None)
-        for worker in self._workers:
-            worker.free()
-        self._recycle_workers()
-        self.report_worker_usage()
+        for worker in list(self._worker_of_url.values()):
+            self._free_worker(worker)
+        self._update_usage()
 
     def report_worker_usage(self):
-        finished_count = 0
-        working_count = 0
-        free_count = 0
-        for w in self._workers:
-            if w.get_query() is None:
-                free_count += 1
-            elif w.working_on_query():
-                working_count += 1
-            else:
-                finished_count += 1
-        self.usage_updated.emit(finished_count, working_count, free_count)
+        """Emit usage_updated now."""
+        self._last_usage = None  # emit even if unchanged
+        self._usage_dirty = True
+        self._emit_updates()
+
+    def set_pool_budget(self, max_workers: int, max_memory: int) -> None:
+        """
+        Set the max number of workers and their max estimated memory [bytes]. Finished pages neither shown nor being
+        loaded are evicted in LRU order to stay within the budget. The pool may exceed it with pages being loaded.
+        """
+        self._max_workers = max(max_workers, self._PREFETCH_LENGTH)
+        self._max_memory = max_memory
+        self._enforce_budget()
+
+    def pool_size(self) -> int:
+        return len(self._workers)
+
+    def estimated_memory(self) -> int:
+        """Estimated memory of the workers [bytes]."""
+        return sum(self._WORKER_MEMORY + self._PAGE_MEMORY_FACTOR * w.get_page_size() for w in self._workers)
+
+    def pool_stats(self) -> dict:
+        return {"workers": len(self._workers), "estimated_memory": self.estimated_memory(),
+                "evicted": self._evicted_count, "restored": self._restored_count}
+
+    def pool_timings(self) -> dict:
+        """
+        Durations of allocating a worker, reusing one for a query (starting the load), resetting a free one and
+        destroying one: operation -> {"count", "total_ms", "max_ms"}.
+        """
+        return {operation: dict(timing) for operation, timing in self._timings.items()}
+
+    def _record_timing(self, operation: str, start: float) -> None:
+        elapsed = (perf_counter() - start) * 1000
+        timing = self._timings[operation]
+        timing["count"] += 1
+        timing["total_ms"] += elapsed
+        timing["max_ms"] = max(timing["max_ms"], elapsed)
+
+    def update_stats(self) -> dict:
+        """Counts of usage and progress updates, and of those emitted after coalescing."""
+        return {"usage_events": self._usage_events, "usage_emitted": self._usage_emitted,
+                "progress_events": self._progress_events, "progress_emitted": self._progress_emitted}
+
+    def _update_usage(self) -> None:
+        self._usage_events += 1
+        self._usage_dirty = True
+        self._request_update()
+
+    def _request_update(self) -> None:
+        if self._update_timer.isActive():
+            return  # will be emitted on timeout
+        self._emit_updates()
+        self._update_timer.start(self._UPDATE_INTERVAL)
+
+    @QtCore.pyqtSlot()
+    def _update_timeout(self):
+        if self._usage_dirty or self._pending_progress is not None:
+            self._emit_updates()
+            self._update_timer.start(self._UPDATE_INTERVAL)
+
+    def _emit_updates(self) -> None:
+        if self._usage_dirty:
+            self._usage_dirty = False
+            usage = (len(self._finished_workers), len(self._working_workers), len(self._free_workers))
+            if usage != self._last_usage:
+                self._last_usage = usage
+                self._usage_emitted += 1
+                self.usage_updated.emit(*usage)
+        if self._pending_progress is not None:
+            progress = self._pending_progress
+            self._pending_progress = None
+            self._emit_active_worker_progress(progress)
+
+    def _emit_active_worker_progress(self, progress: int) -> None:
+        if progress != self._last_progress:
+            self._last_progress = progress
+            self._progress_emitted += 1
+            self.active_worker_progress.emit(progress)
 
     def has_prefetched(self, subject: str, query_type: QueryType, cid: int) -> bool:
         return self._search_worker_working_on_query(Query(subject, query_type, cid)) is not None
 
     def _search_worker_working_on_query(self, query: Query) -> Optional[QueryWorker]:
-        for worker in self._workers:
-            if worker.get_query() == query:
+        """Return the worker working on or having finished the URL of the query, for any cid, or None."""
+        return self._worker_of_url.get(QueryWorker._get_url(query.query_type, query.subject))
+
+    def _subscribe(self, worker: QueryWorker, cid: int) -> None:
+        """Subscribe the cid to the worker, emitting the COLLINS results it has already got."""
+        cids = self._cids_of_worker[worker]
+        if cid in cids:
+            return
+        cids[cid] = None
+        self._workers_by_cid.setdefault(cid, set()).add(worker)
+        if worker.get_collins_suggestion() is not None:
+            self.collins_suggestion_retrieved.emit(cid, worker.get_collins_suggestion())
+        if worker.get_collins_freq() is not None:
+            self.collins_freq_retrieved.emit(cid, *worker.get_collins_freq())
+
+    def _subscribe_to_worker(self, query: Query) -> bool:
+        """If a worker or a fetch is working on the URL of the query, subscribe its cid to it and return True."""
+        worker = self._search_worker_working_on_query(query)
+        if worker is not None:
+            self._subscribe(worker, query.cid)
+            return True
+        fetch_id = self._fetch_of_url.get(QueryWorker._get_url(query.query_type, query.subject))
+        if fetch_id is not None:
+            self._cids_of_fetch[fetch_id][query.cid] = None
+            self._fetch_ids_by_cid.setdefault(query.cid, set()).add(fetch_id)
+            return True
+        return False
+
+    def _start_worker(self, worker: QueryWorker, query: Query) -> None:
+        """Start the query on a free worker."""
+        url = QueryWorker._get_url(query.query_type, query.subject)
+        self._free_workers.remove(worker)  # mostly the last one
+        del self._free_since[worker]
+        self._working_workers[worker] = None
+        self._worker_of_url[url] = worker
+        self._cids_of_worker[worker] = {query.cid: None}
+        self._workers_by_cid.setdefault(query.cid, set()).add(worker)
+
+        # Indices are updated before, as starting processes events
+        start = perf_counter()
+        page = None
+        if self._page_cache is not None and query.query_type == QueryType.COLLINS and worker.can_restore():
+            page = self._page_cache.get(url)
+        if page is not None:
+            self._restored_count += 1
+            worker.restore(query, url, page[0], page[1])
+        else:
+            worker.start(query)
+        self._record_timing("reuse", start)
+
+    def _free_worker(self, worker: QueryWorker, reset: bool = True) -> None:
+        """Free a worker. Unless it's shown, reset it if reset, i.e. unless it's reused at once."""
+        query = worker.get_query()
+        if query is None:
+            return
+        self._working_workers.pop(worker, None)
+        self._finished_workers.pop(worker, None)
+        del self._worker_of_url[worker.get_url()]
+        for cid in self._cids_of_worker.pop(worker):
+            workers = self._workers_by_cid.get(cid)
+            if workers is not None:  # None if being discarded
+                workers.discard(worker)
+                if len(workers) == 0:
+                    del self._workers_by_cid[cid]
+        self._free_workers.append(worker)
+        self._free_since[worker] = monotonic()
+        worker.free()
+        if reset and worker is not self._active_worker:
+            self._reset_worker(worker)
+        self._schedule_shrink()
+
+    def _reset_worker(self, worker: QueryWorker) -> None:
+        start = perf_counter()
+        worker.reset()
+        self._record_timing("reset", start)
+
+    def _evict_worker(self, worker: QueryWorker, reset: bool) -> None:
+        """Free a finished worker, storing its page in the page cache if possible."""
+        html = worker.get_page_html()
+        if self._page_cache is not None and html is not None and worker.load_succeeded() and worker.can_restore():
+            self._page_cache.put(worker.get_url(), worker.get_page_url(), html)
+        self._evicted_count += 1
+        self._free_worker(worker, reset)
+
+    def _get_an_evictable_worker(self, include_upcoming: bool) -> Optional[QueryWorker]:
+        """
+        Get the least recently used worker which has finished a query not shown, or None. Upcoming queries within the
+        prefetch depth are only considered if include_upcoming, after the others.
+        """
+        upcoming = {QueryWorker._get_url(q.query_type, q.subject) for q in self._upcoming[:self.get_prefetch_depth()]}
+        candidates = [w for w in self._finished_workers if w is not self._active_worker]  # least recently used first
+        for worker in candidates:
+            if worker.get_url() not in upcoming:
                 return worker
-        return None
+        return candidates[0] if include_upcoming and len(candidates) > 0 else None
+
+    def _enforce_budget(self) -> None:
+        if len(self._workers) <= self._max_workers and self.estimated_memory() <= self._max_memory:
+            return
+
+        # Release pages left in free workers first
+        for worker in self._free_workers:
+            if worker.get_page_size() > 0 and worker is not self._active_worker:
+                self._reset_worker(worker)
+        self._destroy_workers_over_budget()
+
+        while len(self._workers) > self._max_workers or self.estimated_memory() > self._max_memory:
+            worker = self._get_an_evictable_worker(include_upcoming=True)
+            if worker is None:
+                break  # only pages shown or being loaded left
+            self._evict_worker(worker, reset=True)
+            self._destroy_workers_over_budget()
+        self._update_usage()
+
+    def _destroy_workers_over_budget(self) -> None:
+        """Destroy free workers beyond _PREFETCH_LENGTH at once while over the budget, the least recently freed first."""
+        while len(self._workers) > self._max_workers or self.estimated_memory() > self._max_memory:
+            worker = self._get_a_destroyable_worker()
+            if worker is None:
+                break
+            self._destroy_worker(worker)
+
+    def _enqueue(self, query: Query) -> None:
+        self._queue.append(query)
+        self._queued_by_cid.setdefault(query.cid, set()).add(query)
 
     def _set_active_worker(self, worker: Optional[QueryWorker]) -> None:
         """
         Hide the original active worker (if not None), set self._active_worker, make the new active worker visible
         (if not None) and emit active_worker_progress.
         """
+        # Pages shown are the most recently used
+        for w in [self._active_worker, worker]:
+            if w in self._finished_workers:
+                self._finished_workers[w] = self._finished_workers.pop(w)
+
+        # A worker freed while shown is reset once hidden
+        previous = self._active_worker
+        self._active_worker = worker
+        if previous is not None and previous is not worker and previous.get_query() is None:
+            self._reset_worker(previous)
+
+        self._pending_progress = None  # of the previous active worker
         if worker is not None:
             self._layout.setCurrentWidget(worker)
-            self.active_worker_progress.emit(worker.get_progress())
+            self._emit_active_worker_progress(worker.get_progress())
         else:
-            self.active_worker_progress.emit(-1)
+            self._emit_active_worker_progress(-1)
 
-    def _issue_prefetch(self):
-        if len(self._queue) == 0:
-            return  # nothing to prefetch
+    def _schedule_prefetch(self) -> None:
+        """Issue prefetches once back to the event loop."""
+        if not self._prefetch_timer.isActive():
+            self._prefetch_timer.start(0)
 
-        worker = self._get_a_free_worker()
-        if worker is None:
-            return  # prefetch only if there is a free worker
+    def _issue_prefetch(self):
+        """Start as many prefetches as the concurrency cap and workers allow."""
+        loading = len(self._working_workers) - (1 if self._active_worker in self._working_workers else 0)
+        while loading < self._max_concurrent_prefetches:
+            query = self._next_upcoming()
+            if query is not None:
+                worker = self._get_a_free_worker()
+                if worker is None:
+                    worker = self._get_a_reclaimable_worker()
+            else:
+                # The queue is served only when a free worker is left for the next upcoming entry
+                active_free = self._active_worker is not None and self._active_worker.get_query() is None
+                free_count = len(self._free_workers) - (1 if active_free else 0)
+                if free_count <= 1:
+                    self._skip_queued()  # queries of URLs loaded since they were queued subscribe to them
+                    return
+                worker = self._get_a_free_worker()
+                query = self._next_queued()
+            if worker is None or query is None:
+                return  # nothing to prefetch or no worker to prefetch with
+            self._start_worker(worker, query)
+            loading += 1
+
+    def _next_upcoming(self) -> Optional[Query]:
+        """Pick the next upcoming query within the prefetch depth not prefetched yet, or None."""
+        # Upcoming entries are prefetched to be shown, even if their COLLINS results are cached
+        for query in self._upcoming[:self.get_prefetch_depth()]:
+            worker = self._search_worker_working_on_query(query)
+            if worker is None:
+                return query
+            self._subscribe(worker, query.cid)
+        return None
 
+    def _next_queued(self) -> Optional[Query]:
+        """Pop the next query from the queue to prefetch, or None."""
+        self._skip_queued()
+        if len(self._queue) == 0:
+            return None
         query = self._queue.popleft()
+        self._unindex_queued(query)
+        return query
+
+    def _skip_queued(self) -> None:
+        """Pop the queries at the head of the queue which need no load, until one does."""
+        while len(self._queue) > 0:
+            query = self._queue[0]
+
+            # Skip discarded queries, and duplicates of a query already popped
+            queued = self._queued_by_cid.get(query.cid)
+            if queued is None or query not in queued:
+                self._queue.popleft()
+                continue
+
+            # Check whether there is a worker working on the URL, maybe for another cid
+            worker = self._search_worker_working_on_query(query)
+            if worker is not None:
+                self._queue.popleft()
+                self._unindex_queued(query)
+                self._subscribe(worker, query.cid)
+                continue
+
+            # The word may have been cached by another query since queued
+            if self._emit_cached_collins(query):
+                self._queue.popleft()
+                self._unindex_queued(query)
+                continue
 
-        # Check whether there is a worker working on the query
-        if self._search_worker_working_on_query(query) is not None:
             return
 
-        worker.start(query)
+    def _unindex_queued(self, query: Query) -> None:
+        queued = self._queued_by_cid[query.cid]
+        queued.remove(query)
+        if len(queued) == 0:
+            del self._queued_by_cid[query.cid]
+
+    def _get_a_reclaimable_worker(self) -> Optional[QueryWorker]:
+        """Get a worker which has finished a query neither shown nor upcoming, and free it. If none, return None."""
+        worker = self._get_an_evictable_worker(include_upcoming=False)
+        if worker is not None:
+            self._evict_worker(worker, reset=False)
+        return worker
 
-    def _get_a_free_worker(self) -> Optional[QueryWorker]:
-        """Get a free QueryWorker (excluding the active worker). If all workers are busy, return None."""
-        for worker in self._workers:
-            if worker.get_query() is None:
+    def _get_a_free_worker(self, allow_active: bool = False) -> Optional[QueryWorker]:
+        """
+        Get a free QueryWorker (excluding the active worker unless allow_active). If all workers are busy, return None.
+        """
+        # The active worker is at most one of the last two
+        for worker in reversed(self._free_workers[-2:]):
+            if allow_active or worker is not self._active_worker:
                 return worker
         return None
 
     def _allocate_a_new_worker(self) -> QueryWorker:
         """Create a new worker, add it to self._workers and return."""
+        start = perf_counter()
         worker = QueryWorker(self)
         self._workers.append(worker)
+        self._free_workers.append(worker)
+        self._free_since[worker] = monotonic()
         worker.setVisible(False)
         worker.progress_changed.connect(self._handle_worker_progress)
         worker.collins_freq_retrieved.connect(self._handle_collins_freq)
         worker.collins_suggestion_retrieved.connect(self._handle_collins_suggestion)
+        worker.query_finished.connect(self._handle_query_finished)
+        worker.page_measured.connect(self._handle_page_measured)
         self._layout.addWidget(worker)
+        self._record_timing("allocate", start)
         return worker
 
-    def _recycle_workers(self) -> None:
-        """Deallocate exceeded workers. Do not call this function inside an iteration of self._workers."""
+    @QtCore.pyqtSlot()
+    def _warm_up(self):
+        """Create prefetch workers one per event loop iteration, not to block the startup."""
+        if len(self._workers) < self._PREFETCH_LENGTH:
+            self._allocate_a_new_worker()
+            self._update_usage()
+            self._schedule_prefetch()
+            QtCore.QTimer.singleShot(0, self._warm_up)
+
+    def _destroy_worker(self, worker: QueryWorker) -> None:
+        """Destroy a free worker."""
+        start = perf_counter()
+        self._workers.remove(worker)
+        self._free_workers.remove(worker)
+        del self._free_since[worker]
+        self._layout.removeWidget(worker)
+        worker.deleteLater()  # destroyed once back to the event loop, without processing events here
+        self._record_timing("destroy", start)
+
+    def _schedule_shrink(self) -> None:
+        if len(self._workers) > self._PREFETCH_LENGTH and not self._shrink_timer.isActive():
+            self._shrink_timer.start(self._SHRINK_INTERVAL)
+
+    @QtCore.pyqtSlot()
+    def _shrink_workers(self):
+        """Destroy the least recently freed worker beyond _PREFETCH_LENGTH if free for _SHRINK_DELAY."""
         if len(self._workers) <= self._PREFETCH_LENGTH:
+            self._shrink_timer.stop()
             return
+        worker = self._get_a_destroyable_worker()
+        if worker is not None and monotonic() - self._free_since[worker] >= self._SHRINK_DELAY:
+            self._destroy_worker(worker)
+            self._update_usage()
 
-        # Search in workers and gather workers to delete
-        delete_list: List[QueryWorker] = []
-        for worker in self._workers:
-            if worker.get_query() is None:
-                if len(self._workers) - len(delete_list) > self._PREFETCH_LENGTH:
-                    delete_list.append(worker)
-                else:
-                    break
-
-        # Delete workers
-        if len(delete_list) > 0:
-            for worker in delete_list:
-                if worker is self._active_worker:
-                    self._set_active_worker(None)
-                self._workers.remove(worker)
-                worker.deleteLater()
-            delete_list.clear()
-            QtCore.QCoreApplication.processEvents()
+    def _get_a_destroyable_worker(self) -> Optional[QueryWorker]:
+        """Return the least recently freed worker not shown, or None if none or only _PREFETCH_LENGTH workers left."""
+        if len(self._workers) <= self._PREFETCH_LENGTH:
+            return None
+        for worker in self._free_workers[:2]:
+            if worker is not self._active_worker:
+                return worker
+        return None
 
     @QtCore.pyqtSlot(int)
     def _handle_worker_progress(self, progress: int):
         worker: QueryWorker = cast(QueryWorker, self.sender())
         if worker is self._active_worker:
-            self.active_worker_progress.emit(progress)
-        self.report_worker_usage()
+            self._progress_events += 1
+            self._pending_progress = progress
+        self._update_usage()  # loads starting and finishing change the usage
+
+    @QtCore.pyqtSlot(Query, bool, float)
+    def _handle_query_finished(self, query: Query, ok: bool, load_time: float):
+        worker: QueryWorker = cast(QueryWorker, self.sender())
+        if worker in self._working_workers:
+            del self._working_workers[worker]
+            self._finished_workers[worker] = None
+        if ok:
+            self._load_time += self._AVERAGE_WEIGHT * (load_time - self._load_time)
+        self._schedule_prefetch()  # a worker is no longer loading
+
+    @QtCore.pyqtSlot(int)
+    def _handle_page_measured(self, size: int):
+        self._enforce_budget()
+
+    def _subscribed_cids(self, worker: QueryWorker, query: Query) -> List[int]:
+        return list(self._cids_of_worker.get(worker, {query.cid: None}))
 
     @QtCore.pyqtSlot(Query, str)
     def _handle_collins_suggestion(self, query: Query, suggestion: str):
-        self.collins_suggestion_retrieved.emit(query.cid, suggestion)
+        worker: QueryWorker = cast(QueryWorker, self.sender())
+        for cid in self._subscribed_cids(worker, query):
+            self.collins_suggestion_retrieved.emit(cid, suggestion)
 
     @QtCore.pyqtSlot(Query, int, str)
     def _handle_collins_freq(self, query: Query, freq: int, freq_note: str):
-        self.collins_freq_retrieved.emit(query.cid, freq, freq_note)
+        worker: QueryWorker = cast(QueryWorker, self.sender())
+        # Cache only pages loaded completely and landed on a dictionary entry, not timeouts or error pages
+        suggestion = worker.get_collins_suggestion()
+        if self._collins_cache is not None and worker.load_succeeded() and suggestion is not None:
+            self._collins_cache.put(QuerySettings["CollinsDirectory"], QueryWorker.preprocess_subject(query.subject),
+                                    suggestion, freq, freq_note)
+        for cid in self._subscribed_cids(worker, query):
+            self.collins_freq_retrieved.emit(cid, freq, freq_note)
+
+    def _fetch_collins(self, query: Query) -> None:
+        fetch_id = self._next_fetch_id
+        self._next_fetch_id += 1
+
+        def done(page: CollinsPage):  # on a fetcher thread
+            try:
+                self._collins_page_fetched.emit(fetch_id, page)
+            except RuntimeError:
+                pass  # the view has been deleted at exit
+
+        # done() is emitted through a queued connection, so the entry is always added before it's handled
+        url = QueryWorker._get_url(query.query_type, query.subject)
+        future = self._collins_fetcher.fetch(url, done)
+        self._collins_fetches[fetch_id] = (query, future)
+        self._fetch_of_url[url] = fetch_id
+        self._cids_of_fetch[fetch_id] = {query.cid: None}
+        self._fetch_ids_by_cid.setdefault(query.cid, set()).add(fetch_id)
+
+    def _pop_fetch(self, fetch_id: int) -> Tuple[Query, Future]:
+        """Remove the fetch from the indices, except _fetch_ids_by_cid, and return (query, future)."""
+        query, future = self._collins_fetches.pop(fetch_id)
+        del self._fetch_of_url[QueryWorker._get_url(query.query_type, query.subject)]
+        del self._cids_of_fetch[fetch_id]
+        return query, future
+
+    @QtCore.pyqtSlot(int, CollinsPage)
+    def _handle_collins_page_fetched(self, fetch_id: int, page: CollinsPage):
+        if fetch_id not in self._collins_fetches:
+            return  # discarded
+        cids = list(self._cids_of_fetch[fetch_id])
+        query, _ = self._pop_fetch(fetch_id)
+        for cid in cids:
+            self._fetch_ids_by_cid[cid].discard(fetch_id)
+            if len(self._fetch_ids_by_cid[cid]) == 0:
+                del self._fetch_ids_by_cid[cid]
+        if page.error is not None:
+            for cid in cids:  # fall back to loading the page in a webview, once for all of them
+                self._enqueue(Query(query.subject, query.query_type, cid))
+            self._schedule_prefetch()
+            return
+
+        suggestion = QueryWorker._get_word_from_collins_url(page.final_url)
+        if self._collins_cache is not None and suggestion is not None:
+            self._collins_cache.put(QuerySettings["CollinsDirectory"], QueryWorker.preprocess_subject(query.subject),
+                                    suggestion, page.freq, page.freq_note)
+        for cid in cids:
+            if suggestion is not None:
+                self.collins_suggestion_retrieved.emit(cid, suggestion)
+            self.collins_freq_retrieved.emit(cid, page.freq, page.freq_note)
+
+    def _emit_cached_collins(self, query: Query) -> bool:
+        """If the query is a COLLINS query found in the cache, emit its results and return True."""
+        if self._collins_cache is None or query.query_type != QueryType.COLLINS:
+            return False
+        entry = self._collins_cache.get(QuerySettings["CollinsDirectory"],
+                                        QueryWorker.preprocess_subject(query.subject))
+        if entry is None:
+            return False
+        if entry.suggestion is not None:
+            self.collins_suggestion_retrieved.emit(query.cid, entry.suggestion)
+        self.collins_freq_retrieved.emit(query.cid, entry.freq, entry.freq_note)
+        return True
 
     @QtCore.pyqtSlot()
     def _delay_request_timeout(self):
@@ -0,0 +1,301 @@
+import os
+import sys
+import types
+from time import monotonic
+from unittest import TestCase, mock
+from concurrent.futures import Future
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt6 import QtCore, QtWidgets
+
+try:
+    import QWebKitView
+except ImportError:  # only built on macOS, and QueryWorker is stubbed anyway
+    QWebKitView = types.ModuleType("QWebKitView")
+    QWebKitView.QWebKitView = QtWidgets.QWidget
+    sys.modules["QWebKitView"] = QWebKitView
+
+import web_query_view
+from web_query_view import *
+from collins_fetcher import CollinsPage
+from page_cache import PageCache
+
+COLLINS = QueryWorker._get_url(QueryType.COLLINS)
+
+
+class StubQueryWorker(QueryWorker):
+    """QueryWorker without a webview. Loads are finished by finish()."""
+
+    def __init__(self, parent=None):
+        QtWidgets.QWidget.__init__(self, parent)
+        self._query = None
+        self._progress = 0
+        self._working_on_query = False
+        self._load_ok = False
+        self._load_started = 0
+        self._collins_suggestion = None
+        self._collins_freq = None
+        self._url = ""
+        self._page_size = 0
+        self._page_html = None
+        self.loads = []  # URLs loaded from the network
+        self.restores = []  # URLs restored from the page cache
+        self.resets = 0
+
+    def start(self, query: Query) -> None:
+        self._reset_query(query, self._get_url(query.query_type, query.subject))
+        self.loads.append(self._url)
+        self._working_on_query = True
+        self._handle_progress_change(0)
+
+    def restore(self, query: Query, url: str, final_url: str, html: str) -> None:
+        self._reset_query(query, url)
+        self.restores.append(url)
+        self._working_on_query = True
+        self._handle_progress_change(0)
+
+    def _reset_query(self, query: Query, url: str) -> None:
+        self._query = query
+        self._url = url
+        self._load_ok = False
+        self._load_started = monotonic()
+        self._collins_suggestion = None
+        self._collins_freq = None
+        self._page_size = 0
+        self._page_html = None
+
+    def can_restore(self) -> bool:
+        return True
+
+    def reset(self) -> None:
+        self.resets += 1
+        self._page_size = 0
+        self._page_html = None
+
+    def stop(self) -> None:
+        if self._working_on_query:
+            self.finish(ok=False)
+
+    def free(self) -> None:
+        self._working_on_query = False
+        self._query = None
+
+    def get_page_url(self) -> str:
+        return self._url
+
+    def finish(self, ok: bool = True, freq: int = 3, size: int = 1000) -> None:
+        """Finish the load, with a COLLINS page of the frequency landed on the word."""
+        query = self._query
+        self._working_on_query = False
+        self._load_ok = ok
+        self.query_finished.emit(query, ok, 1.0)
+        if query.query_type == QueryType.COLLINS and ok:
+            self._collins_suggestion = query.subject
+            self.collins_suggestion_retrieved.emit(query, query.subject)
+            self._page_html = "x" * size
+            self._page_size = size
+            self._collins_freq = (freq, "note")
+            self.collins_freq_retrieved.emit(query, freq, "note")
+        else:
+            self._page_size = size
+        self._handle_progress_change(-1)
+        self.page_measured.emit(self._page_size)
+
+
+class StubFetcher:
+    def __init__(self):
+        self.fetches = []  # (url, done, future)
+
+    def fetch(self, url, done):
+        future = Future()
+        self.fetches.append((url, done, future))
+        return future
+
+
+def process_events(ms: int = 0) -> None:
+    loop = QtCore.QEventLoop()
+    QtCore.QTimer.singleShot(ms, loop.quit)
+    loop.exec()
+
+
+class WebQueryViewTest(TestCase):
+    def setUp(self):
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        patcher = mock.patch.object(web_query_view, "QueryWorker", StubQueryWorker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.page_cache = PageCache()
+        self.addCleanup(self.page_cache.close)
+        self.fetcher = StubFetcher()
+        self.view = WebQueryView(None, page_cache=self.page_cache)
+        while self.view.pool_size() < WebQueryView._PREFETCH_LENGTH:  # created one per event loop iteration
+            process_events()
+        self.suggestions = []
+        self.freqs = []
+        self.view.collins_suggestion_retrieved.connect(lambda cid, s: self.suggestions.append((cid, s)))
+        self.view.collins_freq_retrieved.connect(lambda cid, freq, note: self.freqs.append((cid, freq)))
+
+    def worker_of(self, subject: str, query_type: QueryType = QueryType.COLLINS) -> Optional[StubQueryWorker]:
+        return self.view._worker_of_url.get(QueryWorker._get_url(query_type, subject))
+
+    def usage(self) -> (int, int, int):
+        return len(self.view._finished_workers), len(self.view._working_workers), len(self.view._free_workers)
+
+    def test_state_transitions(self):
+        self.assertEqual((0, 0, 5), self.usage())
+        self.view.request("run", QueryType.COLLINS, 1)
+        worker = self.worker_of("run")
+        self.assertEqual([COLLINS + "run"], worker.loads)
+        self.assertNotIn(worker, self.view._free_workers)
+        self.assertEqual((0, 1, 4), self.usage())
+
+        worker.finish()
+        self.assertEqual((1, 0, 4), self.usage())
+        self.assertEqual([(1, "run")], self.suggestions)
+        self.assertEqual([(1, 3)], self.freqs)
+
+        self.view.discard_by_cid(1)
+        self.assertEqual((0, 0, 5), self.usage())
+        self.assertIs(worker, self.view._free_workers[-1])  # reused first
+        self.assertEqual({}, self.view._worker_of_url)
+        self.assertEqual({}, self.view._workers_by_cid)
+        self.assertEqual(0, worker.resets)  # still shown
+
+    def test_queue(self):
+        self.view.prefetch_queued("a", QueryType.COLLINS, 1)
+        self.view.prefetch_queued("b", QueryType.COLLINS, 2)
+        self.view.prefetch_queued("c", QueryType.COLLINS, 3)
+        self.assertEqual({1, 2, 3}, set(self.view._queued_by_cid))
+        self.view.discard_by_cid(2)
+        self.assertNotIn(2, self.view._queued_by_cid)
+
+        process_events()
+        self.assertIsNotNone(self.worker_of("a"))
+        self.assertIsNone(self.worker_of("b"))  # discarded, skipped
+        self.assertIsNotNone(self.worker_of("c"))
+        self.assertEqual({}, self.view._queued_by_cid)
+
+    def test_upcoming_before_queue(self):
+        self.view.prefetch_queued("queued", QueryType.COLLINS, 10)
+        self.view.set_upcoming(0, [Query("a", QueryType.COLLINS, 1), Query("b", QueryType.COLLINS, 2),
+                                   Query("c", QueryType.COLLINS, 3)])
+        process_events()
+        self.assertEqual(2, self.view.get_prefetch_depth())  # load time 3 s, dwell time 10 s
+        self.assertIsNotNone(self.worker_of("a"))
+        self.assertIsNotNone(self.worker_of("b"))
+        self.assertIsNone(self.worker_of("c"))  # beyond the prefetch depth
+        self.assertIsNotNone(self.worker_of("queued"))  # with workers left for the next upcoming entry
+
+        self.view.set_max_concurrent_prefetches(1)
+        self.assertEqual(1, self.view.get_prefetch_depth())
+
+    def test_discard_shared_url(self):
+        self.view.prefetch_immediately("run", QueryType.COLLINS, 1)
+        self.view.prefetch_immediately("run", QueryType.COLLINS, 2)
+        worker = self.worker_of("run")
+        self.assertEqual(1, len(worker.loads))
+        self.assertEqual({1: None, 2: None}, self.view._cids_of_worker[worker])
+        self.assertEqual({1: {worker}, 2: {worker}}, self.view._workers_by_cid)
+
+        self.view.discard_by_cid(1)
+        self.assertIs(worker, self.worker_of("run"))  # still subscribed by cid 2
+        self.assertEqual({2: None}, self.view._cids_of_worker[worker])
+        worker.finish(freq=4)
+        self.assertEqual([(2, 4)], self.freqs)
+
+        self.view.prefetch_immediately("run", QueryType.COLLINS, 3)  # subscribes after the results
+        self.assertEqual([(2, 4), (3, 4)], self.freqs)
+        self.assertEqual([(2, "run"), (3, "run")], self.suggestions)
+
+        self.view.discard_by_cid(2)
+        self.view.discard_by_cid(3)
+        self.assertIsNone(self.worker_of("run"))
+        self.assertIn(worker, self.view._free_workers)
+        self.assertEqual({}, self.view._cids_of_worker)
+
+    def test_fetch_shared_url(self):
+        view = WebQueryView(None, collins_fetcher=self.fetcher)
+        freqs = []
+        view.collins_freq_retrieved.connect(lambda cid, freq, note: freqs.append((cid, freq)))
+        for cid in [1, 2, 3]:
+            view.prefetch_queued("run", QueryType.COLLINS, cid)
+        self.assertEqual(1, len(self.fetcher.fetches))
+        self.assertEqual({1, 2, 3}, set(view._fetch_ids_by_cid))
+
+        url, done, future = self.fetcher.fetches[0]
+        view.discard_by_cid(1)
+        self.assertFalse(future.cancelled())
+        done(CollinsPage(url, url, 5, "note"))
+        process_events()
+        self.assertEqual([(2, 5), (3, 5)], freqs)
+        self.assertEqual({}, view._fetch_ids_by_cid)
+
+        view.prefetch_queued("walk", QueryType.COLLINS, 4)
+        view.prefetch_queued("walk", QueryType.COLLINS, 5)
+        future = self.fetcher.fetches[1][2]
+        view.discard_by_cid(4)
+        self.assertFalse(future.cancelled())
+        view.discard_by_cid(5)
+        self.assertTrue(future.cancelled())
+
+    def test_budget_eviction_order(self):
+        self.view.set_pool_budget(5, 5 * WebQueryView._WORKER_MEMORY + 3 * 20 * 1000)  # 3 pages of 1000 characters
+        for cid, subject in enumerate(["a", "b", "c"]):
+            self.view.prefetch_immediately(subject, QueryType.COLLINS, cid)
+            self.worker_of(subject).finish(size=1000)
+        self.view.request("a", QueryType.COLLINS, 0)  # shown, so the most recently used
+        self.assertEqual(0, self.view.pool_stats()["evicted"])
+
+        self.view.prefetch_immediately("d", QueryType.COLLINS, 3)
+        self.worker_of("d").finish(size=1000)
+        self.assertIsNone(self.worker_of("b"))  # the least recently used
+        self.assertIsNotNone(self.worker_of("a"))
+        self.assertIsNotNone(self.worker_of("c"))
+        self.assertEqual(1, self.view.pool_stats()["evicted"])
+        self.assertLessEqual(self.view.estimated_memory(), self.view._max_memory)
+
+        self.view.prefetch_immediately("b", QueryType.COLLINS, 1)  # restored from the page cache
+        self.assertEqual([COLLINS + "b"], self.worker_of("b").restores)
+        self.worker_of("b").finish(size=1000)
+        self.assertIsNone(self.worker_of("c"))  # evicted in turn
+
+    def test_shrink_hysteresis(self):
+        for cid in range(8):
+            self.view.prefetch_immediately("w%d" % cid, QueryType.GOOGLE, cid)
+        self.assertEqual(8, self.view.pool_size())
+        for cid in range(8):
+            self.view.discard_by_cid(cid)
+        self.assertEqual(8, self.view.pool_size())  # kept warm
+        self.assertTrue(self.view._shrink_timer.isActive())
+
+        self.view._shrink_workers()
+        self.assertEqual(8, self.view.pool_size())  # not free for long enough
+
+        self.view.prefetch_immediately("again", QueryType.GOOGLE, 10)  # reused, not allocated
+        self.assertEqual(8, self.view.pool_size())
+        self.view.discard_by_cid(10)
+
+        for worker in self.view._free_since:
+            self.view._free_since[worker] -= WebQueryView._SHRINK_DELAY
+        self.view._shrink_workers()
+        self.assertEqual(7, self.view.pool_size())  # one at a time
+        for _ in range(5):
+            self.view._shrink_workers()
+        self.assertEqual(5, self.view.pool_size())  # down to the prefetch length
+        self.assertFalse(self.view._shrink_timer.isActive())
+        self.assertEqual(3, self.view.pool_timings()["destroy"]["count"])
+
+    def test_coalesced_updates(self):
+        usages = []
+        self.view.usage_updated.connect(lambda *usage: usages.append(usage))
+        while self.view._update_timer.isActive():  # let updates of the setup be emitted
+            process_events(10)
+        usages.clear()
+        for cid in range(4):
+            self.view.prefetch_immediately("w%d" % cid, QueryType.GOOGLE, cid)
+        self.assertEqual(1, len(usages))  # the first at once, the others coalesced
+        process_events(WebQueryView._UPDATE_INTERVAL * 2)
+        self.assertEqual((0, 4, 1), usages[-1])
+        self.assertEqual(2, len(usages))
+        stats = self.view.update_stats()
+        self.assertLess(stats["usage_emitted"], stats["usage_events"])